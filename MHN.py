@@ -2,15 +2,29 @@
 '''
     MHN.py
     Author: npeterson
-    Revised: 5/11/17
+    Revised: 10/16/26
     ---------------------------------------------------------------------------
     A class for importing into MHN processing scripts, containing frequently
     used methods and variables.
 
+    arcpy takes several seconds to import, so it is only imported (by
+    import_arcpy()) when an MHN object is created or a method that uses it is
+    called, & the MHN's spatial reference is only described when first
+    requested. Scripts that only need the pure-Python helpers -- path
+    finding, TIPIDs, bearings, batchin parsing -- don't wait for it.
+
 '''
 import os
 import sys
-import arcpy
+
+
+def import_arcpy():
+    ''' Import & return arcpy, with overwriteOutput set, as the MHN tools
+        expect. '''
+    import arcpy
+    arcpy.env.overwriteOutput = True
+    return arcpy
+
 
 class MasterHighwayNetwork(object):
     ''' An object containing properties and methods relating to the MHN processing
@@ -262,7 +276,7 @@ class MasterHighwayNetwork(object):
 
 
     def __init__(self, mhn_gdb_path, zone_gdb_path=None):
-        arcpy.env.overwriteOutput = True
+        import_arcpy()  # Tool scripts use arcpy directly, too
 
         # -----------------------------------------------------------------------------
         #  SET GDB-SPECIFIC VARIABLES
@@ -302,7 +316,7 @@ class MasterHighwayNetwork(object):
         }
         self.pnr_name = 'parknride'
         self.pnr = os.path.join(self.gdb, self.pnr_name)
-        self.projection = arcpy.Describe(self.hwynet).spatialReference
+        self._projection = None  # Described on first use (see projection property)
 
         # Zone geodatabase structure (default to zone_systems.gdb in same dir as MHN gdb)
         if zone_gdb_path:
@@ -320,10 +334,27 @@ class MasterHighwayNetwork(object):
         self.mhn2iris_name = 'mhn2iris'
         self.mhn2iris = os.path.join(self.gdb, self.mhn2iris_name)
 
+        # Attribute cache (see cached_attributes())
+        self._attribute_cache = {}
+        self.attribute_cache_hits = 0
+        self.attribute_cache_misses = 0
+
         ### End MasterHighwayNetwork.__init__() def ###
         return None
 
 
+    # -----------------------------------------------------------------------------
+    #  DEFINE PROPERTIES
+    # -----------------------------------------------------------------------------
+    @property
+    def projection(self):
+        ''' The spatial reference of the MHN, described on first use. '''
+        if self._projection is None:
+            arcpy = import_arcpy()
+            self._projection = arcpy.Describe(self.hwynet).spatialReference
+        return self._projection
+
+
     # -----------------------------------------------------------------------------
     #  DEFINE METHODS
     # -----------------------------------------------------------------------------
@@ -341,29 +372,108 @@ class MasterHighwayNetwork(object):
 
 
     @staticmethod
-    def build_geometry_dict(lyr, key_field):
-        ''' For an input layer and a key field, returns a dictionary whose values
-            are the arcpy geometry objects for the corresponding key. These objects
-            can then be fetched by key and strung into a new array -- much faster
-            than querying-and-dissolving if creating a large number of features,
-            but some time is lost in the creation of this dict, so there is a
-            definite trade-off. '''
-        geom_dict = {}
-        with arcpy.da.SearchCursor(lyr, [key_field, 'SHAPE@']) as cursor:
+    def build_route_wkb(vertex_buffer, keys):
+        ''' Assemble a multipart polyline from a build_vertex_buffer() buffer,
+            with one part for each of a sequence of keys (skipping keys not in
+            the buffer), as WKB for a 'SHAPE@WKB' cursor field. Each part is a
+            slice of the coordinate buffer, so no point objects are created.
+            Raises ValueError if none of the keys are in the buffer. '''
+        import struct
+        coords, index = vertex_buffer
+        parts = []
+        for key in keys:
+            if key in index:
+                offset, length = index[key]
+                part = coords[2 * offset:2 * (offset + length)]
+                if sys.byteorder != 'little':
+                    part.byteswap()
+                parts.append(struct.pack('<BII', 1, 2, length) + (getattr(part, 'tobytes', None) or part.tostring)())
+        if not parts:
+            raise ValueError('None of the keys have vertices in the buffer.')
+        return bytearray(struct.pack('<BII', 1, 5, len(parts)) + b''.join(parts))
+
+
+    @staticmethod
+    def build_vertex_buffer(lyr, key_field):
+        ''' For an input layer and a key field, returns a (coords, index) tuple
+            holding the vertices of every feature: coords is a flat array of
+            x, y values, and index maps each key to the (offset, length) of its
+            vertices (in points) within coords. Routes can then be assembled
+            from slices of the buffer by build_route_wkb() -- much faster than
+            querying-and-dissolving if creating a large number of features,
+            but some time is lost reading the buffer, so there is a definite
+            trade-off. Shapes are read as WKB, without creating geometry or
+            point objects; multipart shapes' parts are concatenated, and only
+            x & y are kept (as arcpy.Polyline() would from points). '''
+        arcpy = import_arcpy()
+        import struct
+        from array import array
+        dimensions = {0: 2, 1000: 3, 2000: 3, 3000: 4}  # Coordinates per point of ISO WKB (none, Z, M, ZM) types
+        coords = array('d')
+        index = {}
+        with arcpy.da.SearchCursor(lyr, [key_field, 'SHAPE@WKB']) as cursor:
             for row in cursor:
                 key = row[0]
-                geom = row[1]
-                geom_dict[key] = arcpy.Array()
-                for part in geom:
-                    for point in part:
-                        geom_dict[key].add(point)
-        return geom_dict
+                wkb = bytes(row[1] or b'')
+                offset = len(coords) // 2
+                if wkb:
+                    byte_order = '<' if wkb[0:1] == b'\x01' else '>'
+                    geom_type, = struct.unpack_from(byte_order + 'I', wkb, 1)
+                    dims = dimensions.get(geom_type // 1000 * 1000)
+                    if geom_type % 1000 == 2:  # LineString
+                        part_count, position = 1, 0
+                    elif geom_type % 1000 == 5:  # MultiLineString (of LineStrings, each with its own header)
+                        part_count, = struct.unpack_from(byte_order + 'I', wkb, 5)
+                        position = 9
+                    if geom_type % 1000 not in (2, 5) or dims is None:
+                        raise ValueError('{0} {1} is not a polyline (WKB type {2}).'.format(key_field, key, geom_type))
+                    for part_number in range(part_count):
+                        point_count, = struct.unpack_from(byte_order + 'I', wkb, position + 5)
+                        end = position + 9 + 8 * dims * point_count
+                        part = array('d')
+                        (getattr(part, 'frombytes', None) or part.fromstring)(wkb[position + 9:end])
+                        if (byte_order == '<') != (sys.byteorder == 'little'):
+                            part.byteswap()
+                        if dims > 2:
+                            xy = array('d', [0.0]) * (2 * point_count)
+                            xy[0::2] = part[0::dims]
+                            xy[1::2] = part[1::dims]
+                            part = xy
+                        coords.extend(part)
+                        position = end
+                index[key] = (offset, len(coords) // 2 - offset)
+        return coords, index
+
+
+    def cached_attributes(self, make_attributes, fc, key_field, attr_list):
+        ''' Return make_attributes(fc, key_field, attr_list), where
+            make_attributes is make_attribute_dict or make_attribute_columns,
+            from this MHN's attribute cache if possible. Cached results are
+            keyed by (function, table, key field, columns) and reused until
+            invalidate_attribute_cache() is called for the table, so scripts
+            must call it after editing a table they read through the cache.
+            Only tables & feature classes in a file geodatabase are cached;
+            layers & views (whose names are reused with different queries)
+            and in_memory objects are always read anew. Hits & misses are
+            counted in attribute_cache_hits and attribute_cache_misses. '''
+        key = (make_attributes.__name__, fc, key_field, tuple(attr_list))
+        if key in self._attribute_cache:
+            self.attribute_cache_hits += 1
+            return self._attribute_cache[key]
+        self.attribute_cache_misses += 1
+        attributes = make_attributes(fc, key_field, attr_list)
+        folders = fc.lower().replace('\\', '/').split('/')[:-1]
+        if any(folder.endswith('.gdb') for folder in folders):
+            self._attribute_cache[key] = attributes
+        return attributes
 
 
     def calculate_itin_measures(self, itin_table):
         ''' Calculates the F_MEAS and T_MEAS values for each row in an itin table,
             based on the MILES values of the corresponding MHN arc. '''
-        abb_miles_dict = self.make_attribute_dict(self.arc, 'ABB', attr_list=['MILES'])
+        arcpy = import_arcpy()
+        abb_index, abb_columns = self.cached_attributes(self.make_attribute_columns, self.arc, 'ABB', ['MILES'])
+        abb_miles = abb_columns['MILES']
         route_miles_dict = {}
 
         # 1st loop to determine total route lengths.
@@ -372,14 +482,13 @@ class MasterHighwayNetwork(object):
                 route = row[0]
                 abb = row[1]
                 if route in route_miles_dict:
-                    route_miles_dict[route] += abb_miles_dict[abb]['MILES']
+                    route_miles_dict[route] += abb_miles[abb_index[abb]]
                 else:
-                    route_miles_dict[route] = abb_miles_dict[abb]['MILES']
+                    route_miles_dict[route] = abb_miles[abb_index[abb]]
 
         # 2nd loop to calculate F_MEAS and T_MEAS for each row.
         sql = (None, 'ORDER BY TRANSIT_LINE, ITIN_ORDER')
         with arcpy.da.UpdateCursor(itin_table, ['TRANSIT_LINE', 'ITIN_ORDER', 'ABB', 'F_MEAS', 'T_MEAS'], sql_clause=sql) as cursor:
-            order_tracker = 0
             cumulative_percent = 0
             for row in cursor:
                 route = row[0]
@@ -387,13 +496,12 @@ class MasterHighwayNetwork(object):
                 abb = row[2]
                 if row_order == 1:  # Beginning of new route
                     cumulative_percent = 0
-                segment_length = abb_miles_dict[abb]['MILES']
+                segment_length = abb_miles[abb_index[abb]]
                 segment_percent = segment_length / route_miles_dict[route] * 100
                 row[3] = cumulative_percent
                 new_cumulative_percent = cumulative_percent + segment_percent
                 row[4] = new_cumulative_percent
                 cursor.updateRow(row)
-                order_tracker = row_order
                 cumulative_percent = new_cumulative_percent
 
         return itin_table
@@ -402,6 +510,7 @@ class MasterHighwayNetwork(object):
     @staticmethod
     def delete_if_exists(filepath):
         ''' Check if a file exists, and delete it if so. '''
+        arcpy = import_arcpy()
         if arcpy.Exists(filepath):
             arcpy.Delete_management(filepath)
             message = filepath + ' successfully deleted.'
@@ -410,17 +519,30 @@ class MasterHighwayNetwork(object):
         return message
 
 
+    def delete_skinny_key_set(self, out_obj):
+        ''' Delete a Feature Layer or Table View made by make_skinny_key_set(),
+            along with the in_memory copy it was made from. '''
+        arcpy = import_arcpy()
+        arcpy.Delete_management(out_obj)
+        return self.delete_if_exists(os.path.join(self.mem, '{0}_keys'.format(out_obj)))
+
+
     @staticmethod
     def determine_arc_bearing(line_geom):
         ''' Determines the cardinal direction of a single arc, determined from its
-            two endpoints. The angle is determined by the atan2() function, and
-            after some numeric manipulation is then used to select the correct
-            cardinal direction from an ordered list of possibilities. '''
+            two endpoints (see determine_bearing()). '''
+        return MasterHighwayNetwork.determine_bearing(
+            line_geom.firstPoint.X, line_geom.firstPoint.Y, line_geom.lastPoint.X, line_geom.lastPoint.Y
+        )
+
+
+    @staticmethod
+    def determine_bearing(x1, y1, x2, y2):
+        ''' Determines the cardinal direction from (x1, y1) to (x2, y2). The
+            angle is determined by the atan2() function, and after some numeric
+            manipulation is then used to select the correct cardinal direction
+            from an ordered list of possibilities. '''
         from math import atan2, degrees, floor
-        x1 = line_geom.firstPoint.X
-        y1 = line_geom.firstPoint.Y
-        x2 = line_geom.lastPoint.X
-        y2 = line_geom.lastPoint.Y
         xdiff = x2 - x1
         ydiff = y2 - y1
         angle = degrees(atan2(ydiff, xdiff))
@@ -433,6 +555,7 @@ class MasterHighwayNetwork(object):
     @staticmethod
     def determine_OID_fieldname(fc):
         ''' Determines the Object ID fieldname for the specified fc/table. '''
+        arcpy = import_arcpy()
         describe = arcpy.Describe(fc)
         OID_name = describe.OIDFieldName
         return OID_name
@@ -455,6 +578,7 @@ class MasterHighwayNetwork(object):
     @staticmethod
     def die(error_message=''):
         ''' End processing prematurely. '''
+        arcpy = import_arcpy()
         arcpy.AddError('\n' + error_message + '\n')
         sys.exit()
         return None
@@ -471,11 +595,10 @@ class MasterHighwayNetwork(object):
 
     @staticmethod
     def find_shortest_path(graph, start, end):
-        ''' Recursive function written by Chris Laffra to find shortest path
-            between 2 nodes in a graph; implementation of Dijkstra's algorithm.
-            Based on <http://code.activestate.com/recipes/119466/#c6>.
-
-            Example graph dictionary (sub-dicts contain distances):
+        ''' Find the shortest path between 2 nodes in a graph, using Dijkstra's
+            algorithm. The graph may be a shortest_path.Graph object (compact
+            arrays, see shortest_path.read_network_csv()) or a dictionary whose
+            sub-dicts contain distances, e.g.:
 
                 {'a': {'w': 14, 'x': 7, 'y': 9},
                  'b': {'w': 9, 'z': 6},
@@ -483,25 +606,16 @@ class MasterHighwayNetwork(object):
                  'x': {'a': 7, 'y': 10, 'z': 15},
                  'y': {'a': 9, 'w': 2, 'x': 10, 'z': 11},
                  'z': {'b': 6, 'x': 15, 'y': 11}}
-        '''
-        import heapq
-        queue = [(0, start, [])]
-        seen = set()
-        while True:
-            (p_cost, node, path) = heapq.heappop(queue)
-            if node not in seen:
-                path = path + [node]
-                seen.add(node)
-                if node == end:
-                    return p_cost, path
-                if node in graph.keys():
-                    for (b_node, b_cost) in graph[node].iteritems():
-                        heapq.heappush(queue, (p_cost + b_cost, b_node, path))
+
+            Returns a (cost, [nodes]) tuple, or None if there is no path. '''
+        from shortest_path import find_shortest_path
+        return find_shortest_path(graph, start, end)
 
 
     def get_yearless_hwyproj(self):
         ''' Check hwyproj completion years and return list of invalid projects'
             TIPIDs. '''
+        arcpy = import_arcpy()
         common_id_field = self.route_systems[self.hwyproj][1]
         invalid_year_query = '"{0}" = 0 OR "{0}" IS NULL'.format('COMPLETION_YEAR')
         invalid_year_lyr = self.make_skinny_table_view(self.hwyproj, 'invalid_year_lyr', ['COMPLETION_YEAR', common_id_field], invalid_year_query)
@@ -512,6 +626,32 @@ class MasterHighwayNetwork(object):
             return []
 
 
+    @staticmethod
+    def get_line_ids_from_itin(itin):
+        ''' Parse an itinerary batchin file to obtain line IDs. '''
+        line_ids = set()
+        with open(itin, 'rb') as r:
+            for line in r:
+                # Lines starting with "a" contain header info
+                if line.startswith('a'):
+                    attr = line.strip().split()
+                    line_id = attr[1].replace("'", "")
+                    line_ids.add(line_id)
+        return line_ids
+
+
+    def invalidate_attribute_cache(self, fc=None):
+        ''' Drop the attribute cache's results (see cached_attributes()) for a
+            table or feature class that has been edited, or for all tables if
+            fc is None. '''
+        if fc is None:
+            self._attribute_cache.clear()
+        else:
+            for key in [key for key in self._attribute_cache if key[1] == fc]:
+                del self._attribute_cache[key]
+        return None
+
+
     @staticmethod
     def is_tipid(in_str):
         ''' Check whether a string is a properly formatted TIPID. '''
@@ -526,6 +666,22 @@ class MasterHighwayNetwork(object):
         return is_tipid
 
 
+    @staticmethod
+    def iter_rows_by_keys(in_obj, key_field, keys, fields, where_clause='', exclude=False):
+        ''' Yield the rows (as tuples of the specified fields) of a feature
+            class/table whose key_field value is in a Python set of keys -- or,
+            if exclude is True, is not in it -- and which match an optional SQL
+            query. Replaces a cursor on a '"key_field" IN (...)' query for large
+            key sets: the table is read in a single cursor pass & filtered in
+            memory, so no giant IN-list is built (or parsed). '''
+        arcpy = import_arcpy()
+        keys = set(keys)
+        with arcpy.da.SearchCursor(in_obj, list(fields) + [key_field], where_clause) as cursor:
+            for row in cursor:
+                if (row[-1] in keys) != exclude:
+                    yield row[:-1]
+
+
     @staticmethod
     def make_attribute_dict(fc, key_field, attr_list=['*']):
         ''' Create a dictionary of feature class/table attributes, using OID as the
@@ -535,6 +691,7 @@ class MasterHighwayNetwork(object):
               be fetched by MHN.determine_OID_fieldname(fc).
             - NOTE 2: using attr_list=[] will essentially build a list of unique
               key_field values. '''
+        arcpy = import_arcpy()
         attr_dict = {}
         fc_field_objects = arcpy.ListFields(fc)
         fc_fields = [field.name for field in fc_field_objects if field.type != 'Geometry']
@@ -550,6 +707,34 @@ class MasterHighwayNetwork(object):
         return attr_dict
 
 
+    @staticmethod
+    def make_attribute_columns(fc, key_field, attr_list, reader=None, null_value=None):
+        ''' A columnar alternative to make_attribute_dict(), for large tables
+            when only a few attributes are needed. Returns a (key_index, columns)
+            tuple: key_index maps each key_field value to a row index, and
+            columns maps each field in attr_list to a typed array of values,
+            so the attribute of a key is columns[field][key_index[key]].
+            - NOTE 1: the table is read in bulk by reader(fc, fields), which
+              defaults to arcpy.da.TableToNumPyArray(). Any reader returning
+              columns by field name, each with a tolist() method (e.g. NumPy
+              arrays or array.array), can be used instead.
+            - NOTE 2: TableToNumPyArray() can't read nulls in numeric fields
+              unless a null_value is given to replace them with. '''
+        if reader is None:
+            arcpy = import_arcpy()
+            if null_value is None:
+                reader = arcpy.da.TableToNumPyArray
+            else:
+                reader = lambda fc, fields: arcpy.da.TableToNumPyArray(fc, fields, null_value=null_value)
+        from copy import copy
+        fields = [key_field] + [field for field in attr_list if field != key_field]
+        table = reader(fc, fields)
+        keys = table[key_field].tolist()
+        key_index = dict(zip(keys, range(len(keys))))
+        columns = dict((field, copy(table[field])) for field in attr_list)  # Copies, so the rest of the table can be freed
+        return key_index, columns
+
+
     @staticmethod
     def make_path(directory, filename, extension=''):
         ''' Combines a directory, name and optional extension to create a full-path
@@ -565,6 +750,7 @@ class MasterHighwayNetwork(object):
         ''' Make an ArcGIS Feature Layer or Table View, containing only the fields
             specified in keep_fields_list, using an optional SQL query. Default
             will create a layer/view with NO fields. '''
+        arcpy = import_arcpy()
         field_info_str = ''
         input_fields = arcpy.ListFields(in_obj)
         if not keep_fields_list:
@@ -588,10 +774,75 @@ class MasterHighwayNetwork(object):
         return self.make_skinny(False, table, view, keep_fields_list, where_clause)
 
 
+    def make_skinny_key_set(self, is_geo, in_obj, out_obj, key_field, keys, keep_fields_list=None, where_clause='', or_where_clause=''):
+        ''' Make a skinny Feature Layer or Table View (see make_skinny()) of the
+            rows whose key_field value is in a Python set of keys, instead of
+            with a '"key_field" IN (...)' query. The rows are copied, with only
+            the fields in keep_fields_list (and geometry, for a layer), to an
+            in_memory feature class/table named out_obj + '_keys', from which
+            the layer/view is made. Rows matching an optional or_where_clause
+            are selected whatever their key (e.g. '"BASELINK" = '1' OR "ABB" IN
+            (...)'), and are copied in bulk, followed by the other rows whose
+            key is in keys, which are found in a single cursor pass (see
+            iter_rows_by_keys()). An optional where_clause applies to all rows.
+            - NOTE: the copy's OIDs & row order differ from those of in_obj,
+              and edits to it don't change in_obj.
+            - Delete the layer/view with delete_skinny_key_set(), which also
+              deletes the copy. '''
+        arcpy = import_arcpy()
+        copy = os.path.join(self.mem, '{0}_keys'.format(out_obj))
+        self.delete_if_exists(copy)
+
+        # Copy the rows matching or_where_clause (if any; otherwise none, which
+        # creates an empty copy) in bulk, with only the kept fields.
+        if or_where_clause:
+            bulk_query = '({0}) AND ({1})'.format(or_where_clause, where_clause) if where_clause else or_where_clause
+        else:
+            bulk_query = '"{0}" < 0'.format(self.determine_OID_fieldname(in_obj))
+        bulk_obj = self.make_skinny(is_geo, in_obj, '{0}_bulk'.format(out_obj), keep_fields_list, bulk_query)
+        if is_geo:
+            arcpy.CopyFeatures_management(bulk_obj, copy)
+        else:
+            arcpy.CopyRows_management(bulk_obj, copy)
+        arcpy.Delete_management(bulk_obj)
+        or_oids = set()
+        if or_where_clause:
+            with arcpy.da.SearchCursor(in_obj, ['OID@'], bulk_query) as cursor:
+                or_oids.update(row[0] for row in cursor)
+
+        # Add the other rows whose key is in keys.
+        copy_field_names = [field.name for field in arcpy.ListFields(copy) if field.type not in ('OID', 'Geometry')]
+        copy_fields = [field for field in (keep_fields_list or []) if field in copy_field_names]
+        if is_geo:
+            copy_fields.append('SHAPE@')
+        with arcpy.da.InsertCursor(copy, copy_fields) as insert_cursor:
+            for row in self.iter_rows_by_keys(in_obj, key_field, keys, copy_fields + ['OID@'], where_clause):
+                if row[-1] not in or_oids:
+                    insert_cursor.insertRow(row[:-1])
+
+        return self.make_skinny(is_geo, copy, out_obj, keep_fields_list)
+
+    # Wrapper functions for make_skinny_key_set()
+    def make_skinny_key_set_layer(self, fc, lyr, key_field, keys, keep_fields_list=None, where_clause='', or_where_clause=''):
+        return self.make_skinny_key_set(True, fc, lyr, key_field, keys, keep_fields_list, where_clause, or_where_clause)
+    def make_skinny_key_set_view(self, table, view, key_field, keys, keep_fields_list=None, where_clause='', or_where_clause=''):
+        return self.make_skinny_key_set(False, table, view, key_field, keys, keep_fields_list, where_clause, or_where_clause)
+
+
+    @staticmethod
+    def quote_csv_value(value):
+        ''' Quote a string for a CSV file if it contains a comma, quote or line
+            break (doubling any quotes), as SAS's dsd option expects. '''
+        if ',' in value or '"' in value or '\n' in value or '\r' in value:
+            return '"' + value.replace('"', '""') + '"'
+        return value
+
+
     @staticmethod
     def set_nulls(value, fc, fields):
         ''' Recalculate all null values in a list of specified fields to a
             specified replacement value. '''
+        arcpy = import_arcpy()
         if type(value) is str:
             valid_types = ['String']
         else:
@@ -662,19 +913,21 @@ class MasterHighwayNetwork(object):
         return ts
 
 
-    def tipid_from_int(self, n):
+    @staticmethod
+    def tipid_from_int(n):
         ''' Format an integer < 100,000,000 as a TIPID string. '''
         try:
             n_str = str(int(n)).zfill(8)
             tipid = '-'.join((n_str[:2], n_str[2:4], n_str[4:]))
         except:
             return None
-        return tipid if self.is_tipid(tipid) else None
+        return tipid if MasterHighwayNetwork.is_tipid(tipid) else None
 
 
-    def tipid_to_int(self, tipid):
+    @staticmethod
+    def tipid_to_int(tipid):
         ''' Convert a TIPID string to an integer. '''
-        if self.is_tipid(tipid):
+        if MasterHighwayNetwork.is_tipid(tipid):
             n_str = tipid.replace('-', '')
             return int(n_str)
         else:
@@ -687,7 +940,9 @@ class MasterHighwayNetwork(object):
             of the corresponding MHN arc and the original DEP_TIME/ARR_TIME
             values themselves. Any segments where ARR_TIME = DEP_TIME will
             have travel time estimated by distance of link, at 30mph. '''
-        abb_miles_dict = self.make_attribute_dict(self.arc, 'ABB', attr_list=['MILES'])
+        arcpy = import_arcpy()
+        abb_index, abb_columns = self.cached_attributes(self.make_attribute_columns, self.arc, 'ABB', ['MILES'])
+        abb_miles = abb_columns['MILES']
 
         # Loop to update times for each row, as appropriate
         sql = (None, 'ORDER BY TRANSIT_LINE, ITIN_ORDER')
@@ -712,7 +967,7 @@ class MasterHighwayNetwork(object):
 
                 # Re-estimate segment travel time (@ 30mph) when dep_time = arr_time
                 if dep_time == arr_time:
-                    segment_length = abb_miles_dict[abb]['MILES']
+                    segment_length = abb_miles[abb_index[abb]]
                     time_est = int(round(segment_length / 30 * 60 * 60))  # Seconds
                     arr_time += time_est
                     ltime = max(round(time_est / 60., 1), 0.1)  # Minutes (1 d.p.)
@@ -728,6 +983,7 @@ class MasterHighwayNetwork(object):
     def write_arc_flag_file(self, flag_file, flag_query):
         ''' Create a file containing l=anode,bnode rows for all directional links
             meeting a specified criterion. '''
+        arcpy = import_arcpy()
         self.delete_if_exists(flag_file)
         flag_lyr = 'flag_lyr'
         arcpy.MakeFeatureLayer_management(self.arc, flag_lyr, flag_query)
@@ -746,21 +1002,61 @@ class MasterHighwayNetwork(object):
 
 
     @staticmethod
-    def write_attribute_csv(in_obj, textfile, field_list=None, include_headers=True):
+    def write_attribute_csv(in_obj, textfile, field_list=None, include_headers=True, output_format='csv', null_value=None, stats=None):
         ''' Write attributes of a feature class/table to a specified text file.
             Input field_list allows output field order to be specified. Defaults to
-            all non-shape fields. '''
+            all non-shape fields. Values containing commas or quotes are quoted
+            (as SAS expects with the dsd option); others are written as before.
+            Rows are read & formatted in chunks, and written through a large
+            buffer.
+            - output_format='csv.gz' writes a gzipped CSV instead, and
+              output_format='npy' a binary NumPy file of typed columns (read
+              by arcpy.da.TableToNumPyArray(), with nulls in numeric fields
+              replaced by null_value; no headers).
+            - If a stats dict is given, the numbers of files, rows & bytes
+              written are added to its 'files', 'rows' & 'bytes' values. '''
+        arcpy = import_arcpy()
+        from itertools import islice
         all_field_objects = arcpy.ListFields(in_obj)
         valid_field_names = [field.name for field in all_field_objects if field.name != '' and field.type != 'Geometry']
         if not field_list:
             fields = valid_field_names
         else:
             fields = [field for field in field_list if field in valid_field_names]
-        csv = open(textfile,'w')
-        if include_headers:
-            csv.write(','.join(fields) + '\n')
-        with arcpy.da.SearchCursor(in_obj, fields) as cursor:
-            for row in cursor:
-                csv.write(','.join(map(str, row)) + '\n')
-        csv.close()
+
+        if output_format == 'npy':
+            import numpy
+            if null_value is None:
+                table = arcpy.da.TableToNumPyArray(in_obj, fields)
+            else:
+                table = arcpy.da.TableToNumPyArray(in_obj, fields, null_value=null_value)
+            with open(textfile, 'wb') as npy:
+                numpy.save(npy, table)
+            rows = len(table)
+        else:
+            if output_format == 'csv.gz':
+                import gzip
+                out_file = gzip.open(textfile, 'wb')
+            else:
+                out_file = open(textfile, 'w', 1048576)
+            if include_headers:
+                out_file.write(','.join(fields) + '\n')
+            rows = 0
+            with arcpy.da.SearchCursor(in_obj, fields) as cursor:
+                while True:
+                    chunk = list(islice(cursor, 10000))
+                    if not chunk:
+                        break
+                    lines = [','.join(map(str, row)) for row in chunk]
+                    for (n, line) in enumerate(lines):
+                        if line.count(',') != len(fields) - 1 or '"' in line or '\n' in line or '\r' in line:  # Rare: needs quoting
+                            lines[n] = ','.join(MasterHighwayNetwork.quote_csv_value(str(value)) for value in chunk[n])
+                    out_file.write('\n'.join(lines) + '\n')
+                    rows += len(chunk)
+            out_file.close()
+
+        if stats is not None:
+            stats['files'] = stats.get('files', 0) + 1
+            stats['rows'] = stats.get('rows', 0) + rows
+            stats['bytes'] = stats.get('bytes', 0) + os.path.getsize(textfile)
         return textfile
@@ -105,11 +105,10 @@ overlap_transact_attr = [
     'NEW_POSTEDSPEED2', 'NEW_THRULANES1', 'NEW_THRULANES2', 'NEW_THRULANEWIDTH1', 'NEW_THRULANEWIDTH2', 'ADD_PARKLANES1',
     'ADD_PARKLANES2', 'ADD_SIGIC', 'ADD_CLTL', 'ADD_RRGRADECROSS', 'NEW_TOLLDOLLARS', 'NEW_MODES', 'ABB', 'REP_ANODE', 'REP_BNODE'
 ]
-overlap_transact_query = ''' "{0}" IN ('{1}') '''.format(hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id in overlap_projects)))
-overlap_transact_view = MHN.make_skinny_table_view(MHN.route_systems[MHN.hwyproj][0], 'overlap_transact_view', overlap_transact_attr, overlap_transact_query)
+overlap_transact_view = MHN.make_skinny_key_set_view(MHN.route_systems[MHN.hwyproj][0], 'overlap_transact_view', hwyproj_id_field, overlap_projects, overlap_transact_attr)
 MHN.write_attribute_csv(overlap_transact_view, overlap_transact_csv, overlap_transact_attr)
 overlap_project_arcs = [r[0] for r in arcpy.da.SearchCursor(overlap_transact_view, ['ABB'])]
-arcpy.Delete_management(overlap_transact_view)
+MHN.delete_skinny_key_set(overlap_transact_view)
 
 # Export base year arc attributes.
 overlap_network_attr = [
@@ -117,10 +116,9 @@ overlap_network_attr = [
     'THRULANES1', 'THRULANES2', 'THRULANEWIDTH1', 'THRULANEWIDTH2', 'PARKLANES1', 'PARKLANES2', 'SIGIC',
     'CLTL', 'RRGRADECROSS', 'TOLLDOLLARS', 'MODES', 'MILES'
 ]
-overlap_network_query = ''' "BASELINK" = '1' OR "ABB" IN ('{0}') '''.format("','".join((abb for abb in overlap_project_arcs if abb[-1] != '1')))
-overlap_network_view = MHN.make_skinny_table_view(MHN.arc, 'overlap_network_view', overlap_network_attr, overlap_network_query)
+overlap_network_view = MHN.make_skinny_key_set_view(MHN.arc, 'overlap_network_view', 'ABB', overlap_project_arcs, overlap_network_attr, or_where_clause=''' "BASELINK" = '1' ''')
 MHN.write_attribute_csv(overlap_network_view, overlap_network_csv, overlap_network_attr)
-arcpy.Delete_management(overlap_network_view)
+MHN.delete_skinny_key_set(overlap_network_view)
 
 # Process attribute tables with coding_overlap.sas.
 sas1_sas = ''.join((MHN.prog_dir, '/', sas1_name, '.sas'))
@@ -159,12 +157,13 @@ for scen in scen_list:
     MHN.delete_if_exists(hwy_nodes_csv)
 
     arcpy.AddMessage('Generating Scenario {0} ({1}) highway files...'.format(scen, scen_year))
+    export_stats = {}
 
     # Export coding for highway projects completed by scenario year.
     hwy_year_attr = [hwyproj_id_field, 'COMPLETION_YEAR']
     hwy_year_query = '"COMPLETION_YEAR" <= {0}'.format(scen_year)
     hwy_year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'hwy_year_view', hwy_year_attr, hwy_year_query)
-    MHN.write_attribute_csv(hwy_year_view, hwy_year_csv, hwy_year_attr)
+    MHN.write_attribute_csv(hwy_year_view, hwy_year_csv, hwy_year_attr, stats=export_stats)
     hwy_projects = [r for r in arcpy.da.SearchCursor(hwy_year_view, [hwyproj_id_field, 'COMPLETION_YEAR'])]
     arcpy.Delete_management(hwy_year_view)
 
@@ -173,11 +172,11 @@ for scen in scen_list:
         'NEW_POSTEDSPEED2', 'NEW_THRULANES1', 'NEW_THRULANES2', 'NEW_THRULANEWIDTH1', 'NEW_THRULANEWIDTH2', 'ADD_PARKLANES1',
         'ADD_PARKLANES2', 'ADD_SIGIC', 'ADD_CLTL', 'ADD_RRGRADECROSS', 'NEW_TOLLDOLLARS', 'NEW_MODES', 'TOD', 'ABB', 'REP_ANODE', 'REP_BNODE'
     ]
-    hwy_transact_query = ''' "{0}" IN ('{1}') '''.format(hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id, comp_year in hwy_projects)))
-    hwy_transact_view = MHN.make_skinny_table_view(MHN.route_systems[MHN.hwyproj][0], 'hwy_transact_view', hwy_transact_attr, hwy_transact_query)
-    MHN.write_attribute_csv(hwy_transact_view, hwy_transact_csv, hwy_transact_attr)
+    hwy_transact_keys = [hwyproj_id for hwyproj_id, comp_year in hwy_projects]
+    hwy_transact_view = MHN.make_skinny_key_set_view(MHN.route_systems[MHN.hwyproj][0], 'hwy_transact_view', hwyproj_id_field, hwy_transact_keys, hwy_transact_attr)
+    MHN.write_attribute_csv(hwy_transact_view, hwy_transact_csv, hwy_transact_attr, stats=export_stats)
     hwy_abb = [r[0] for r in arcpy.da.SearchCursor(hwy_transact_view, ['ABB'])]
-    arcpy.Delete_management(hwy_transact_view)
+    MHN.delete_skinny_key_set(hwy_transact_view)
 
     # Export arc & node attributes of all baselinks and skeletons used in
     # projects completed by scenario year.
@@ -186,19 +185,19 @@ for scen in scen_list:
         'THRULANES1', 'THRULANES2', 'THRULANEWIDTH1', 'THRULANEWIDTH2', 'PARKLANES1', 'PARKLANES2', 'PARKRES1', 'PARKRES2',
         'SIGIC', 'CLTL', 'RRGRADECROSS', 'TOLLDOLLARS', 'MODES', 'CHIBLVD', 'TRUCKRES', 'VCLEARANCE', 'MILES'
         ]
-    hwy_network_query = ''' "BASELINK" = '1' OR "ABB" IN ('{0}') '''.format("','".join((abb for abb in hwy_abb if abb[-1] != '1')))
-    hwy_network_lyr = MHN.make_skinny_feature_layer(MHN.arc, 'hwy_network_lyr', hwy_network_attr, hwy_network_query)
-    MHN.write_attribute_csv(hwy_network_lyr, hwy_network_csv, hwy_network_attr)
+    hwy_network_lyr = MHN.make_skinny_key_set_layer(MHN.arc, 'hwy_network_lyr', 'ABB', hwy_abb, hwy_network_attr, or_where_clause=''' "BASELINK" = '1' ''')
+    MHN.write_attribute_csv(hwy_network_lyr, hwy_network_csv, hwy_network_attr, stats=export_stats)
     hwy_abb_2 = [r[0] for r in arcpy.da.SearchCursor(hwy_network_lyr, ['ABB'])]
 
     hwy_anodes = [abb.split('-')[0] for abb in hwy_abb_2]
     hwy_bnodes = [abb.split('-')[1] for abb in hwy_abb_2]
-    hwy_nodes_list = list(set(hwy_anodes).union(set(hwy_bnodes)))
+    hwy_nodes_list = [int(node) for node in set(hwy_anodes).union(set(hwy_bnodes))]
     hwy_nodes_attr = ['NODE', 'POINT_X', 'POINT_Y', MHN.zone_attr, MHN.capzone_attr]
-    hwy_nodes_query = '"NODE" IN ({0})'.format(','.join(hwy_nodes_list))
-    hwy_nodes_view = MHN.make_skinny_table_view(MHN.node, 'hwy_nodes_view', hwy_nodes_attr, hwy_nodes_query)
-    MHN.write_attribute_csv(hwy_nodes_view, hwy_nodes_csv, hwy_nodes_attr)
-    arcpy.Delete_management(hwy_nodes_view)
+    hwy_nodes_view = MHN.make_skinny_key_set_view(MHN.node, 'hwy_nodes_view', 'NODE', hwy_nodes_list, hwy_nodes_attr)
+    MHN.write_attribute_csv(hwy_nodes_view, hwy_nodes_csv, hwy_nodes_attr, stats=export_stats)
+    MHN.delete_skinny_key_set(hwy_nodes_view)
+    arcpy.AddMessage('-- Exported {0} rows ({1:.1f} MB) to {2} files.'.format(
+        export_stats['rows'], export_stats['bytes'] / 1048576.0, export_stats['files']))
 
     # Process attribute tables with generate_highway_files_2.sas.
     sas2_sas = os.path.join(MHN.prog_dir, '{0}.sas'.format(sas2_name))
@@ -319,5 +318,5 @@ for scen in scen_list:
         return linkshape
 
     scen_linkshape = generate_linkshape(hwy_network_lyr, scen_path)
-    arcpy.Delete_management(hwy_network_lyr)
+    MHN.delete_skinny_key_set(hwy_network_lyr)
     arcpy.AddMessage('-- Scenario {0} highway.linkshape generated successfully.\n'.format(scen))
@@ -22,6 +22,8 @@
 import os
 import sys
 import arcpy
+from multiprocessing import cpu_count
+from multiprocessing.dummy import Pool as ThreadPool
 from MHN import MasterHighwayNetwork  # Custom class for MHN processing functionality
 
 # -----------------------------------------------------------------------------
@@ -54,37 +56,34 @@ sas3_name = 'generate_transit_files_3'
 # -----------------------------------------------------------------------------
 #  Set diagnostic output locations.
 # -----------------------------------------------------------------------------
-sas1_log = os.path.join(MHN.temp_dir, '{0}.log'.format(sas1_name))
-sas1_lst = os.path.join(MHN.temp_dir, '{0}.lst'.format(sas1_name))
+sas1_log = os.path.join(MHN.temp_dir, '{0}_{{0}}_{{1}}.log'.format(sas1_name))  # Formatted with bus system (base/current) & TOD, like the files below
+sas1_lst = os.path.join(MHN.temp_dir, '{0}_{{0}}_{{1}}.lst'.format(sas1_name))
 sas2_log = os.path.join(MHN.temp_dir, '{0}.log'.format(sas2_name))
 sas2_lst = os.path.join(MHN.temp_dir, '{0}.lst'.format(sas2_name))
 sas3_log = os.path.join(MHN.temp_dir, '{0}.log'.format(sas3_name))
 sas3_lst = os.path.join(MHN.temp_dir, '{0}.lst'.format(sas3_name))
-bus_route_csv = os.path.join(MHN.temp_dir, 'bus_route.csv')
-bus_itin_csv = os.path.join(MHN.temp_dir, 'bus_itin.csv')
-oneline_itin_txt = os.path.join(MHN.temp_dir, 'oneline_itin.txt')  # gtfs_collapse_routes.py input file (called by gtfs_reformat_feed.sas)
-feed_groups_txt = os.path.join(MHN.temp_dir, 'feed_groups.txt')    # gtfs_collapse_routes.py output file
+bus_route_csv = os.path.join(MHN.temp_dir, 'bus_route_{0}_{1}.csv')
+bus_itin_csv = os.path.join(MHN.temp_dir, 'bus_itin_{0}_{1}.csv')
+oneline_itin_txt = os.path.join(MHN.temp_dir, 'oneline_itin_{0}_{1}.txt')  # gtfs_collapse_routes.py input file (called by gtfs_reformat_feed.sas)
+feed_groups_txt = os.path.join(MHN.temp_dir, 'feed_groups_{0}_{1}.txt')    # gtfs_collapse_routes.py output file
 missing_links_csv = os.path.join(MHN.out_dir, 'missing_bus_links.csv')
-link_dict_txt = os.path.join(MHN.out_dir, 'link_dictionary.txt')  # shortest_path.py input file (called by generate_transit_files_2.sas)
+path_links_csv = os.path.join(MHN.out_dir, 'path_links.csv')      # shortest_path.py network file (called by generate_transit_files_2.sas)
+gap_requests_csv = os.path.join(MHN.out_dir, 'gap_requests.csv')  # shortest_path.py input file
 short_path_txt = os.path.join(MHN.out_dir, 'short_path.txt')      # shortest_path.py output file
+path_cache_db = os.path.join(MHN.out_dir, 'path_cache.sqlite')    # shortest_path.py results from previous runs (kept between runs)
 path_errors_txt = os.path.join(MHN.temp_dir, 'path_errors.txt')
 
 
 # -----------------------------------------------------------------------------
 #  Clean up old temp files, if necessary.
 # -----------------------------------------------------------------------------
-MHN.delete_if_exists(sas1_log)
-MHN.delete_if_exists(sas1_lst)
 MHN.delete_if_exists(sas2_log)
 MHN.delete_if_exists(sas2_lst)
 MHN.delete_if_exists(sas3_log)
 MHN.delete_if_exists(sas3_lst)
-MHN.delete_if_exists(bus_route_csv)
-MHN.delete_if_exists(bus_itin_csv)
-MHN.delete_if_exists(oneline_itin_txt)
-MHN.delete_if_exists(feed_groups_txt)
 MHN.delete_if_exists(missing_links_csv)
-MHN.delete_if_exists(link_dict_txt)
+MHN.delete_if_exists(path_links_csv)
+MHN.delete_if_exists(gap_requests_csv)
 MHN.delete_if_exists(short_path_txt)
 MHN.delete_if_exists(path_errors_txt)
 
@@ -116,9 +115,10 @@ if not any(MHN.scenario_years[scen] < MHN.bus_years['current'] for scen in scen_
 if not any(MHN.scenario_years[scen] >= MHN.bus_years['current'] for scen in scen_list):
     del bus_fc_dict[MHN.bus_current]
 
-# Identify representative runs for bus_base and/or bus_current, as relevant.
+# Export runs of bus_base and/or bus_current, as relevant, for each TOD.
+rep_runs_jobs = []
 for bus_fc in bus_fc_dict:
-    arcpy.AddMessage('\nIdentifying representative runs from {0}...'.format(bus_fc))
+    arcpy.AddMessage('\nExporting runs from {0}...'.format(bus_fc))
 
     which_bus = bus_fc_dict[bus_fc]
 
@@ -126,43 +126,68 @@ for bus_fc in bus_fc_dict:
     for tod in out_tod_periods:
         arcpy.AddMessage('-- TOD {0}...'.format(tod.upper()))
 
+        # Each bus system & TOD gets its own files, so they can be processed concurrently.
+        tod_files = [path.format(which_bus, tod) for path in (
+            sas1_log, sas1_lst, bus_route_csv, bus_itin_csv, oneline_itin_txt, feed_groups_txt
+        )]
+        for path in tod_files:
+            MHN.delete_if_exists(path)
+        tod_sas1_log, tod_sas1_lst, tod_bus_route_csv, tod_bus_itin_csv, tod_oneline_itin_txt, tod_feed_groups_txt = tod_files
+
         # Export header info of bus routes in current TOD.
         bus_id_field = MHN.route_systems[bus_fc][1]
         bus_route_attr = [bus_id_field, 'DESCRIPTION', 'MODE', 'VEHICLE_TYPE', 'HEADWAY', 'SPEED', 'ROUTE_ID', 'START']
         bus_route_query = MHN.tod_periods[tod][1]
         bus_route_view = MHN.make_skinny_table_view(bus_fc, 'bus_route_view', bus_route_attr, bus_route_query)
-        MHN.write_attribute_csv(bus_route_view, bus_route_csv, bus_route_attr)
+        MHN.write_attribute_csv(bus_route_view, tod_bus_route_csv, bus_route_attr)
         selected_bus_routes = MHN.make_attribute_dict(bus_route_view, bus_id_field, attr_list=[])
         arcpy.Delete_management(bus_route_view)
 
         # Export itineraries for selected runs.
         bus_order_field = MHN.route_systems[bus_fc][2]
         bus_itin_attr = [bus_id_field, 'ITIN_A', 'ITIN_B', bus_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF']
-        bus_itin_query = ''' "{0}" IN ('{1}') '''.format(bus_id_field, "','".join((bus_id for bus_id in selected_bus_routes)))
-        bus_itin_view = MHN.make_skinny_table_view(MHN.route_systems[bus_fc][0], 'bus_itin_view', bus_itin_attr, bus_itin_query)
-        MHN.write_attribute_csv(bus_itin_view, bus_itin_csv, bus_itin_attr)
-        arcpy.Delete_management(bus_itin_view)
+        bus_itin_view = MHN.make_skinny_key_set_view(MHN.route_systems[bus_fc][0], 'bus_itin_view', bus_id_field, selected_bus_routes, bus_itin_attr)
+        MHN.write_attribute_csv(bus_itin_view, tod_bus_itin_csv, bus_itin_attr)
+        MHN.delete_skinny_key_set(bus_itin_view)
 
-        # Process exported route & itin tables with gtfs_reformat_feed.sas.
-        sas1_sas = os.path.join(MHN.prog_dir, '{0}.sas'.format(sas1_name))
         sas1_output = os.path.join(MHN.temp_dir, 'bus_{0}_runs_{1}.csv'.format(which_bus, tod))
-        sas1_args = [MHN.prog_dir, bus_route_csv, bus_itin_csv, oneline_itin_txt, feed_groups_txt, sas1_output, tod]
+        sas1_args = [MHN.prog_dir, tod_bus_route_csv, tod_bus_itin_csv, tod_oneline_itin_txt, tod_feed_groups_txt, sas1_output, tod]
         MHN.delete_if_exists(sas1_output)
-        MHN.submit_sas(sas1_sas, sas1_log, sas1_lst, sas1_args)
-        if not os.path.exists(sas1_log):
-            MHN.die('{0} did not run!'.format(sas1_sas))
-        elif not os.path.exists(feed_groups_txt):
-            MHN.die('{0} did not run! (Called by {1}.)'.format(os.path.join(MHN.prog_dir, 'gtfs_collapse_routes.py'), sas1_sas))
-        elif os.path.exists(sas1_lst) or not os.path.exists(sas1_output):
-            MHN.die('{0} did not run successfully. Please review {1}.'.format(sas1_sas, sas1_log))
-        else:
-            os.remove(sas1_log)
-            os.remove(bus_route_csv)
-            os.remove(bus_itin_csv)
-            os.remove(oneline_itin_txt)
-            os.remove(feed_groups_txt)
+        rep_runs_jobs.append((which_bus, tod, sas1_output, sas1_args, tod_files))
+
+# Process exported route & itin tables with gtfs_reformat_feed.sas. Each run
+# is a separate SAS process, so they are simply started from a pool of
+# threads (which leaves arcpy in this process only).
+arcpy.AddMessage('\nIdentifying representative runs ({0} bus system/TOD combinations)...'.format(len(rep_runs_jobs)))
+sas1_sas = os.path.join(MHN.prog_dir, '{0}.sas'.format(sas1_name))
+
+
+def submit_rep_runs_job(job):
+    (which_bus, tod, sas1_output, sas1_args, tod_files) = job
+    return MHN.submit_sas(sas1_sas, tod_files[0], tod_files[1], sas1_args)
+
+if rep_runs_jobs:
+    rep_runs_pool = ThreadPool(min(len(rep_runs_jobs), cpu_count()))
+    rep_runs_pool.map(submit_rep_runs_job, rep_runs_jobs)
+    rep_runs_pool.close()
+    rep_runs_pool.join()
+
+for (which_bus, tod, sas1_output, sas1_args, tod_files) in rep_runs_jobs:
+    tod_sas1_log, tod_sas1_lst, tod_bus_route_csv, tod_bus_itin_csv, tod_oneline_itin_txt, tod_feed_groups_txt = tod_files
+    if not os.path.exists(tod_sas1_log):
+        MHN.die('{0} did not run!'.format(sas1_sas))
+    elif not os.path.exists(tod_feed_groups_txt):
+        MHN.die('{0} did not run! (Called by {1}.)'.format(os.path.join(MHN.prog_dir, 'gtfs_collapse_routes.py'), sas1_sas))
+    elif os.path.exists(tod_sas1_lst) or not os.path.exists(sas1_output):
+        MHN.die('{0} did not run successfully. Please review {1}.'.format(sas1_sas, tod_sas1_log))
+    else:
+        os.remove(tod_sas1_log)
+        os.remove(tod_bus_route_csv)
+        os.remove(tod_bus_itin_csv)
+        os.remove(tod_oneline_itin_txt)
+        os.remove(tod_feed_groups_txt)
 
-        rep_runs_dict[which_bus][tod] = sas1_output
+    rep_runs_dict[which_bus][tod] = sas1_output
 
 
 # -----------------------------------------------------------------------------
@@ -288,11 +313,10 @@ for scen in scen_list:
         # Export itineraries for selected runs.
         bus_order_field = MHN.route_systems[bus_fc][2]
         rep_runs_itin_attr = [bus_id_field, 'ITIN_A', 'ITIN_B', bus_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF', 'F_MEAS', 'T_MEAS', 'MILES']
-        rep_runs_itin_query = ''' "{0}" IN ('{1}') '''.format(bus_id_field, "','".join((bus_id for bus_id in selected_runs)))
-        rep_runs_itin_view = MHN.make_skinny_table_view(all_runs_itin_miles_dict[which_bus], 'rep_runs_itin_view', rep_runs_itin_attr, rep_runs_itin_query)
+        rep_runs_itin_view = MHN.make_skinny_key_set_view(all_runs_itin_miles_dict[which_bus], 'rep_runs_itin_view', bus_id_field, selected_runs, rep_runs_itin_attr)
         rep_runs_itin_csv = os.path.join(scen_tran_path, 'rep_runs_itin.csv')
         MHN.write_attribute_csv(rep_runs_itin_view, rep_runs_itin_csv, rep_runs_itin_attr)
-        arcpy.Delete_management(rep_runs_itin_view)
+        MHN.delete_skinny_key_set(rep_runs_itin_view)
 
         # Export future bus header coding as necessary.
         bus_future_lyr = 'future_lyr'
@@ -318,11 +342,10 @@ for scen in scen_list:
         # Corresponding future bus itineraries.
         bus_future_order_field = MHN.route_systems[MHN.bus_future][2]
         bus_future_itin_attr = [bus_future_id_field, 'ITIN_A', 'ITIN_B', bus_future_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF', 'F_MEAS', 'T_MEAS', 'MILES']
-        bus_future_itin_query = ''' "{0}" IN ('{1}') '''.format(bus_future_id_field, "','".join((bus_future_id for bus_future_id in selected_future_runs)))
-        bus_future_itin_view = MHN.make_skinny_table_view(all_runs_itin_miles_dict['future'], 'bus_future_itin_view', bus_future_itin_attr, bus_future_itin_query)
+        bus_future_itin_view = MHN.make_skinny_key_set_view(all_runs_itin_miles_dict['future'], 'bus_future_itin_view', bus_future_id_field, selected_future_runs, bus_future_itin_attr)
         bus_future_itin_csv = os.path.join(scen_tran_path, 'bus_future_itin.csv')
         MHN.write_attribute_csv(bus_future_itin_view, bus_future_itin_csv, bus_future_itin_attr, include_headers=False)  # Skip headers for easier appending
-        arcpy.Delete_management(bus_future_itin_view)
+        MHN.delete_skinny_key_set(bus_future_itin_view)
 
         # Append future header/itin data to base/current header/itin files.
         with open(rep_runs_csv, 'a') as writer:
@@ -427,11 +450,11 @@ for scen in scen_list:
 
         # Replace any missing PNR nodes with closest existing node *in same zone*.
         if missing_pnr_nodes:
-            scen_node_zones = {str(r[0]): r[1] for r in arcpy.da.SearchCursor(MHN.node, ['NODE', MHN.zone_attr])}
+            scen_node_zones = MHN.cached_attributes(MHN.make_attribute_dict, MHN.node, 'NODE', [MHN.zone_attr])  # Read once for all scenarios
             replacements = {}
             node_oid_field = MHN.determine_OID_fieldname(MHN.node)
             for node in missing_pnr_nodes:
-                scen_zone_nodes_query = ''' "NODE" IN ({0}) AND "{1}" = {2} '''.format(','.join(scen_nodes), MHN.zone_attr, scen_node_zones[node])
+                scen_zone_nodes_query = ''' "NODE" IN ({0}) AND "{1}" = {2} '''.format(','.join(scen_nodes), MHN.zone_attr, scen_node_zones[int(node)][MHN.zone_attr])
                 scen_zone_nodes_lyr = MHN.make_skinny_feature_layer(MHN.node, 'scen_nodes_lyr', [node_oid_field, 'NODE'], scen_zone_nodes_query)
                 missing_node_lyr = MHN.make_skinny_feature_layer(MHN.node, 'missing_node_lyr', [node_oid_field, 'NODE'], '"NODE" = {0}'.format(node))
                 closest_node_table = '/'.join((MHN.mem, 'closest_node_table'))
@@ -467,7 +490,7 @@ for scen in scen_list:
         sas2_args = (scen_tran_path, scen_hwy_path, rep_runs_csv, rep_runs_itin_csv, replace_csv, pnr_csv,
                      scen, tod, str(min(MHN.centroid_ranges['CBD'])), str(max(MHN.centroid_ranges['CBD'])),
                      str(MHN.max_poe), min(MHN.scenario_years.keys()), MHN.prog_dir, missing_links_csv,
-                     link_dict_txt, short_path_txt, path_errors_txt, sas2_output)
+                     path_links_csv, short_path_txt, path_errors_txt, sas2_output, gap_requests_csv, path_cache_db)
         if tod == out_tod_periods[0] and os.path.exists(sas2_output):
             os.remove(sas2_output)  # Delete this before first iteration, or else old version will be appended to.
         MHN.submit_sas(sas2_sas, sas2_log, sas2_lst, sas2_args)
@@ -785,18 +808,6 @@ for scen in scen_list:
 # -------------------------------------------------------------------------
 # Create additional ABM inputs, if desired.
 # -------------------------------------------------------------------------
-def get_line_ids_from_itin(itin):
-    ''' Parse an itinerary batchin file to obtain line IDs. '''
-    line_ids = set()
-    with open(itin, 'rb') as r:
-        for line in r:
-            # Lines starting with "a" contain header info
-            if line.startswith('a'):
-                attr = line.strip().split()
-                line_id = attr[1].replace("'", "")
-                line_ids.add(line_id)
-    return line_ids
-
 def get_scen_line_ids():
     ''' Read each of the time-of-day itinerary files to identify each
         line modeled in all scenarios. '''
@@ -806,8 +817,8 @@ def get_scen_line_ids():
         for tod in out_tod_periods:
             bus = os.path.join(scen_tran_path, 'bus.itinerary_{0}'.format(tod))
             rail = os.path.join(scen_tran_path, 'rail.itinerary_{0}'.format(tod))
-            line_ids.update(get_line_ids_from_itin(bus))
-            line_ids.update(get_line_ids_from_itin(rail))
+            line_ids.update(MHN.get_line_ids_from_itin(bus))
+            line_ids.update(MHN.get_line_ids_from_itin(rail))
     return line_ids
 
 if abm_output:
@@ -2,7 +2,7 @@
 '''
     gtfs_collapse_routes.py
     Authors: cheither & npeterson
-    Revised: 4/29/13
+    Revised: 10/16/26
     ---------------------------------------------------------------------------
     This script reads a file of bus run itinerary data and determines which
     runs are similar enough to be combined to create an AM Peak bus network.
@@ -10,71 +10,248 @@
 
       route-id, linename, itin_a1-itin_b1-dwcode1, itin_a2-itin_b2-dwcode2, ...
 
+    Runs are only combined with runs of the same route id, so each route id's
+    runs are grouped separately. The runs of a route id are encoded once as
+    the rows of a sparse run x element incidence matrix (a set of element
+    numbers per run), along with an inverted index of the runs containing
+    each element, so that each base run is only compared with the runs that
+    share its name or an itinerary segment. Groups are numbered in order of
+    their base runs, as before.
+
+    For very large feeds, an approximate mode finds the candidate runs with
+    MinHash signatures & locality-sensitive hashing (LSH) instead: runs are
+    only compared when their signatures agree in at least one band, which
+    favors runs with similar itineraries. The ratio of each candidate is
+    still computed exactly, so every run combined with a base run meets the
+    threshold. But a run that approximate mode fails to combine is left to
+    become a base run itself (or join a later group), so the later groups
+    can differ from exact mode's, combining some runs that exact mode does
+    not. Use --recall to compare both modes on a feed:
+
+      python gtfs_collapse_routes.py oneline_itin.txt feed_groups.txt [--approximate] [--recall]
+
+    The grouping can also be done in-process, without the intermediate
+    files, by importing this module:
+
+      import gtfs_collapse_routes
+      for (linename, group, ratio) in gtfs_collapse_routes.collapse_runs(runs):
+          ...
+
 '''
 from __future__ import print_function
 import csv
 import os
+import random
 import sys
+import time
+from itertools import compress
 
 # -----------------------------------------------------------------------------
 #  Set parameters.
 # -----------------------------------------------------------------------------
 threshold = 85                                             ### Threshold to compare runs & determine they are similar enough to combine.
-infl = sys.argv[1]
-groups = sys.argv[2]
-
-if os.path.exists(groups):
-    os.remove(groups)
+minhash_bands = 16                                         ### Approximate mode: number of LSH bands...
+minhash_rows = 4                                           ### ...& MinHash values per band (more bands/fewer rows = higher recall, more comparisons).
+minhash_seed = 85                                          ### Seed of the MinHash functions, so approximate output is repeatable.
 
 
 # -----------------------------------------------------------------------------
-#  Process feed data transit runs.
+#  Define functions.
 # -----------------------------------------------------------------------------
-lines = list(csv.reader(open(infl)))
-a = []; b = []; a0 = []; b0 = []                           ### Create a set of empty lists.
-z = len(lines)
-grp = 1                                                    ### Group identifier.
-print('PROCESSING ' + str(z) + ' RUNS.')
-
-for qq in lines[:]:                                        ### Make a slice copy to safely modify the list while iterating over it.
-    if z > 0:
-        a = lines[0]
-        a0 = a[1]                                          ### Get route name for base run.
-        zz = len(lines) - 1
-        i = 1
-        ## --> write first run and group to output file
-        outFile = open(groups, 'a')
-        outFile.write(a0 + ',' + str(grp) + '\n')
-        outFile.close()
-
-        for q in range(zz):
-            b = lines[i]
-            b0 = b[1]
-            if a[0] == b[0]:                               ### Compare route ids from each run.
-                a1 = set(a)                                ### Remove duplicate elements for comparison.
-                b1 = set(b)
-                x = len(a1) - 1                            ### Number of elements in base run itinerary (minus 1 to account for name).
-                y = len(a1 & b1)                           ### Number of common elements between base and comparison runs * 100.
-                yy = y * 100                               ### Y times 100 to yield an integer answer.
-                yxratio = yy / x                           ### Ratio of common elements to base run itinerary.
-
-                if yxratio >= threshold:
-                    lines.pop(i)                           ### Remove run from further analysis.
-                    z = len(lines)
-                    ## --> write group to output file
-                    outFile = open(groups, 'a')
-                    outFile.write(b0 + ',' + str(grp) + ',' + str(yxratio) + '\n')
-                    outFile.close()
-                else:
-                    i += 1
-                del a1; del b1
+def collapse_runs(runs, threshold=threshold, approximate=False):
+    ''' Group a list of runs, each a [route-id, linename, segment, ...] list
+        (i.e. a row of the input file), returning (linename, group, ratio)
+        tuples in the order they are written to the output file: each
+        group's base run (with a ratio of None), followed by the runs
+        combined with it. Groups are numbered from 1, in order of their base
+        runs. If approximate is True, candidate runs are found by LSH. '''
+    route_runs = {}                                        ### Runs of each route id, in input order.
+    for (n, run) in enumerate(runs):
+        route_runs.setdefault(run[0], []).append(n)
+
+    base_groups = []                                       ### Groups (as input positions), for numbering in order of their base runs.
+    for route_lines in route_runs.values():
+        for group in group_route_runs([runs[n] for n in route_lines], threshold, approximate):
+            base_groups.append([route_lines[group[0]]] + [(route_lines[k], yxratio) for (k, yxratio) in group[1:]])
+    base_groups.sort()
+
+    collapsed = []
+    for (grp, group) in enumerate(base_groups, 1):         ### Group identifier.
+        collapsed.append((runs[group[0]][1], grp, None))
+        for (n, yxratio) in group[1:]:
+            collapsed.append((runs[n][1], grp, yxratio))
+    return collapsed
+
+
+def group_route_runs(runs, threshold=threshold, approximate=False):
+    ''' Group the runs of a single route id, returning a list of [base,
+        (k, ratio), ...] lists of indices into runs. Each group's base run is
+        the first run not yet in a group, and it is joined by every later run
+        whose ratio (the number of distinct elements it shares with the base
+        run * 100, over the base run's distinct elements minus 1 for the
+        name) meets the threshold.
+
+        All of the runs share their route id, so a run sharing no other
+        element with the base run has a ratio of 100 / x. Unless that meets
+        the threshold, only the runs listed in the inverted index under the
+        base run's other elements (its name & itinerary segments) need to be
+        scored -- or, if approximate is True, only the runs sharing an LSH
+        bucket with the base run. '''
+    elements = {}                                          ### Column number of each distinct element.
+    incidence = [set(elements.setdefault(element, len(elements)) for element in run) for run in runs]
+    route_id = elements[runs[0][0]]
+    if approximate:
+        run_buckets = lsh_buckets(incidence, route_id, len(elements))
+    else:
+        runs_with = {}                                     ### Inverted index: runs containing each element (except route id).
+        for (k, run_elements) in enumerate(incidence):
+            for element in run_elements:
+                if element != route_id:
+                    runs_with.setdefault(element, []).append(k)
+
+    route_groups = []
+    ungrouped = bytearray(b'\x01' * len(runs))            ### 1 for each run not yet in a group.
+    for base in range(len(runs)):
+        if not ungrouped[base]:
+            continue
+        ungrouped[base] = 0
+        base_elements = incidence[base]
+        x = len(base_elements) - 1                         ### Number of elements in base run itinerary (minus 1 to account for name).
+        if x and 100 / x >= threshold:
+            candidates = range(base + 1, len(runs))
+        else:
+            if approximate:
+                candidate_lists = run_buckets[base]
             else:
-                i += 1
-            del b; del b0                                  ### Empty lists.
+                candidate_lists = [runs_with[element] for element in base_elements if element != route_id]
+            candidates = set()
+            for run_list in candidate_lists:
+                run_list[:] = compress(run_list, map(ungrouped.__getitem__, run_list))  ### Drop grouped runs, so they're never rescanned.
+                candidates.update(run_list)
+            candidates = sorted(candidates)
+        group = [base]
+        for other in candidates:
+            if not ungrouped[other] or other < base:
+                continue
+            y = len(base_elements & incidence[other])      ### Number of common elements between base and comparison runs.
+            yy = y * 100                                   ### Y times 100 to yield an integer answer.
+            yxratio = yy / x                               ### Ratio of common elements to base run itinerary.
+            if yxratio >= threshold:
+                ungrouped[other] = 0
+                group.append((other, yxratio))
+        route_groups.append(group)
+    return route_groups
+
+
+def lsh_buckets(incidence, route_id, element_count, bands=None, rows=None):
+    ''' Compute a MinHash signature of bands * rows values for each run's set
+        of elements (except route id), and return, for each run, the list of
+        LSH buckets it falls into: one per band, holding the indices of all
+        runs whose signatures are identical within that band. Two runs with
+        Jaccard similarity s share at least one bucket with probability of
+        about 1 - (1 - s ** rows) ** bands.
+
+        Signatures use one-permutation hashing: each element is hashed once
+        (to a random number), the hashes are split into bands * rows bins by
+        their remainder, and each bin's minimum is a signature value. This
+        costs one hash per element instead of one per element per signature
+        value. Bins left empty by short runs are None, & bands of only empty
+        bins are not bucketed. '''
+    bands = bands or minhash_bands
+    rows = rows or minhash_rows
+    bins = bands * rows
+    rng = random.Random(minhash_seed)
+    element_hashes = [int(rng.getrandbits(31)) for element in range(element_count)]
+    route_id_set = set([route_id])
+
+    buckets = {}
+    run_buckets = []
+    for (k, run_elements) in enumerate(incidence):
+        hashes = sorted(map(element_hashes.__getitem__, run_elements - route_id_set), reverse=True)
+        bin_minimum = dict(zip(map(bins.__rmod__, hashes), hashes))  ### Smallest hash of each bin, as it's zipped last.
+        signature = list(map(bin_minimum.get, range(bins)))
+        run_buckets.append([])
+        for band in range(bands):
+            key = tuple(signature[band * rows:(band + 1) * rows])
+            if key.count(None) < rows:
+                bucket = buckets.setdefault((band, key), [])
+                bucket.append(k)
+                run_buckets[k].append(bucket)
+    return run_buckets
+
+
+def recall_report(runs, threshold=threshold):
+    ''' Group runs in both exact & approximate mode, and return a report of
+        the time taken by each, and of the approximate mode's recall (the
+        share of the runs combined with a base run in exact mode that
+        approximate mode also combines with that base run) and precision (the
+        share of the runs combined with a base run in approximate mode that
+        exact mode also combines with that base run). Returns a (report,
+        collapsed) tuple, where collapsed maps approximate (False or True) to
+        that mode's collapse_runs() output, so it needn't be run again. '''
+    results = {}
+    collapsed_by_mode = {}
+    for approximate in (False, True):
+        start_time = time.time()
+        collapsed = collapse_runs(runs, threshold, approximate)
+        seconds = time.time() - start_time
+        base_names = dict((grp, linename) for (linename, grp, yxratio) in collapsed if yxratio is None)
+        pairs = set((base_names[grp], linename) for (linename, grp, yxratio) in collapsed if yxratio is not None)
+        results[approximate] = (seconds, len(base_names), pairs)
+        collapsed_by_mode[approximate] = collapsed
+
+    (exact_seconds, exact_groups, exact_pairs) = results[False]
+    (approx_seconds, approx_groups, approx_pairs) = results[True]
+    found = len(exact_pairs & approx_pairs)
+    recall = 100.0 * found / len(exact_pairs) if exact_pairs else 100.0
+    precision = 100.0 * found / len(approx_pairs) if approx_pairs else 100.0
+    report = [
+        'MODE          SECONDS   GROUPS   COMBINED RUNS',
+        'exact      {0:10.2f} {1:8d} {2:15d}'.format(exact_seconds, exact_groups, len(exact_pairs)),
+        'approximate{0:10.2f} {1:8d} {2:15d}'.format(approx_seconds, approx_groups, len(approx_pairs)),
+        'RECALL: {0:.2f}% ({1} of {2} combined runs found; {3} bands x {4} rows).'.format(
+            recall, found, len(exact_pairs), minhash_bands, minhash_rows),
+        'PRECISION: {0:.2f}% ({1} of {2} combined runs also combined in exact mode; {3} only in approximate mode).'.format(
+            precision, found, len(approx_pairs), len(approx_pairs) - found),
+    ]
+    return '\n'.join(report), collapsed_by_mode
+
+
+def write_feed_groups(collapsed, groups):
+    ''' Write collapse_runs() output to a file of "linename,group" rows for
+        base runs & "linename,group,ratio" rows for the runs combined with
+        them. '''
+    outFile = open(groups, 'w')
+    for (linename, grp, yxratio) in collapsed:
+        if yxratio is None:
+            outFile.write(linename + ',' + str(grp) + '\n')
+        else:
+            outFile.write(linename + ',' + str(grp) + ',' + str(yxratio) + '\n')
+    outFile.close()
+    return groups
+
+
+def main(argv):
+    flags = [arg for arg in argv if arg.startswith('--')]
+    argv = [arg for arg in argv if not arg.startswith('--')]
+    infl = argv[1]
+    groups = argv[2]
+    if os.path.exists(groups):
+        os.remove(groups)
+
+    lines = list(csv.reader(open(infl)))
+    print('PROCESSING ' + str(len(lines)) + ' RUNS.')
+    approximate = '--approximate' in flags
+    if '--recall' in flags:
+        (report, collapsed_by_mode) = recall_report(lines)
+        print(report)
+        collapsed = collapsed_by_mode[approximate]
+    else:
+        collapsed = collapse_runs(lines, approximate=approximate)
+    if collapsed:  # No groups file for no runs
+        write_feed_groups(collapsed, groups)
+    print('DONE!')
 
-        del a; del a0                                      ### Empty lists.
-        lines.pop(0)
-        z = len(lines)
-        grp += 1
 
-print('DONE!')
+if __name__ == '__main__':
+    main(sys.argv)
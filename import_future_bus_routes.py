@@ -152,8 +152,8 @@ os.remove(future_itin_csv)
 MHN.calculate_itin_measures(temp_itin_table)
 
 # Generate route features one at a time.
-# (Note: not using the MHN.build_geometry_dict() method for bus_future, because
-#  the time saved in construction is lost in dict-building for small coding
+# (Note: not using the MHN.build_vertex_buffer() method for bus_future, because
+#  the time saved in construction is lost in buffer-building for small coding
 #  tables.)
 for route_id in sorted(route_arcs.keys()):
 
@@ -38,8 +38,11 @@ network_csv = os.path.join(MHN.temp_dir, 'network.csv')
 nodes_csv = os.path.join(MHN.temp_dir, 'nodes.csv')
 header_csv = os.path.join(MHN.temp_dir, 'header.csv')
 itin_csv = os.path.join(MHN.temp_dir, 'itin.csv')
-link_dict_txt = os.path.join(MHN.out_dir, 'link_dictionary.txt')  # shortest_path.py input file (called by import_gtfs_bus_routes_2.sas)
+path_links_csv = os.path.join(MHN.out_dir, 'path_links.csv')      # shortest_path.py network file (called by import_gtfs_bus_routes_2.sas)
+gap_requests_csv = os.path.join(MHN.out_dir, 'gap_requests.csv')  # shortest_path.py input file
 short_path_txt = os.path.join(MHN.out_dir, 'short_path.txt')      # shortest_path.py output file
+path_cache_db = os.path.join(MHN.out_dir, 'path_cache.sqlite')    # shortest_path.py results from previous runs (kept between runs)
+path_graph = os.path.join(MHN.out_dir, 'path_links.graph')      # binary copy of path_links_csv (rewritten by shortest_path.py when the network changes)
 path_err_txt = os.path.join(MHN.out_dir, 'path_errors.txt')
 hold_check_csv = os.path.join(MHN.out_dir, 'hold_check.csv')
 hold_times_csv = os.path.join(MHN.out_dir, 'hold_times.csv')
@@ -56,7 +59,8 @@ MHN.delete_if_exists(network_csv)
 MHN.delete_if_exists(nodes_csv)
 MHN.delete_if_exists(header_csv)
 MHN.delete_if_exists(itin_csv)
-MHN.delete_if_exists(link_dict_txt)
+MHN.delete_if_exists(path_links_csv)
+MHN.delete_if_exists(gap_requests_csv)
 MHN.delete_if_exists(short_path_txt)
 MHN.delete_if_exists(path_err_txt)
 MHN.delete_if_exists(hold_check_csv)
@@ -134,9 +138,10 @@ arcpy.AddMessage('{0}Validating coding in {1} & {2}...'.format('\n', raw_header_
 sas1_sas = os.path.join(MHN.prog_dir, '{0}.sas'.format(sas1_name))
 sas1_args = [
     raw_header_csv, raw_itin_csv, transact_csv, network_csv, nodes_csv,
-    MHN.prog_dir, header_csv, itin_csv, pseudo_csv, link_dict_txt,
+    MHN.prog_dir, header_csv, itin_csv, pseudo_csv, path_links_csv,
     short_path_txt, path_err_txt, hold_check_csv, hold_times_csv,
-    routes_processed_csv, str(min_route_id), str(MHN.max_poe), sas1_lst
+    routes_processed_csv, str(min_route_id), str(MHN.max_poe), sas1_lst,
+    gap_requests_csv, path_cache_db, path_graph
 ]
 MHN.submit_sas(sas1_sas, sas1_log, sas1_lst, sas1_args)
 if not os.path.exists(sas1_log):
@@ -197,8 +202,8 @@ MHN.validate_itin_times(temp_itin_table)
 # Update itinerary F_MEAS & T_MEAS.
 MHN.calculate_itin_measures(temp_itin_table)
 
-# Build dict to store all arc geometries for mix-and-match route-building.
-vertices_comprising = MHN.build_geometry_dict(MHN.arc, 'ABB')
+# Build buffer to store all arc vertices for mix-and-match route-building.
+vertices_comprising = MHN.build_vertex_buffer(MHN.arc, 'ABB')
 
 # Generate route features one at a time.
 arcs_traversed_by = {}
@@ -213,10 +218,13 @@ with arcpy.da.SearchCursor(temp_itin_table, field_list) as itin_cursor:
             arcs_traversed_by[common_id] = [abb]
 
 common_id_list = sorted(route_arcs.keys())
-with arcpy.da.InsertCursor(temp_routes_fc, ['SHAPE@', common_id_field]) as routes_cursor:
+with arcpy.da.InsertCursor(temp_routes_fc, ['SHAPE@WKB', common_id_field]) as routes_cursor:
     for common_id in common_id_list:
-        route_vertices = arcpy.Array([vertices_comprising[abb] for abb in arcs_traversed_by[common_id] if abb in vertices_comprising])
-        route = arcpy.Polyline(route_vertices)
+        try:
+            route = MHN.build_route_wkb(vertices_comprising, arcs_traversed_by[common_id])
+        except ValueError:
+            route = None  # Null shape, so the route's attributes are still imported
+            arcpy.AddWarning('   - {0} = {1} has no arcs in the MHN, so it has no shape.'.format(common_id_field, common_id))
         routes_cursor.insertRow([route, common_id])
 
 # Fill other fields with data from future_route_csv.
@@ -96,7 +96,7 @@ else:
 # -----------------------------------------------------------------------------
 #  Copy node attributes to memory, for fast access.
 # -----------------------------------------------------------------------------
-current_nodes_dict = MHN.make_attribute_dict(MHN.node, 'NODE', ['POINT_X','POINT_Y'])
+current_nodes_dict = MHN.cached_attributes(MHN.make_attribute_dict, MHN.node, 'NODE', ['POINT_X','POINT_Y'])
 
 
 # -----------------------------------------------------------------------------
@@ -486,8 +486,8 @@ for ABB_tuple in split_dict:
 # -----------------------------------------------------------------------------
 #  Update route systems.
 # -----------------------------------------------------------------------------
-# Build dict to store all arc geometries for mix-and-match route-building.
-vertices_comprising = MHN.build_geometry_dict(temp_arcs, 'ABB')
+# Build buffer to store all arc vertices for mix-and-match route-building.
+vertices_comprising = MHN.build_vertex_buffer(temp_arcs, 'ABB')
 
 arcpy.AddMessage('\nRebuilding route systems (in memory):')
 
@@ -641,11 +641,10 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
 
     common_id_list = [row[0] for row in arcpy.da.SearchCursor(header, [common_id_field])]
     arcpy.CreateFeatureclass_management(header_updated_path, header_updated_name, 'POLYLINE', header)
-    with arcpy.da.InsertCursor(header_updated, ['SHAPE@', common_id_field]) as routes_cursor:
+    with arcpy.da.InsertCursor(header_updated, ['SHAPE@WKB', common_id_field]) as routes_cursor:
         for common_id in common_id_list:
-            route_vertices = arcpy.Array([vertices_comprising[abb] for abb in arcs_traversed_by[common_id] if abb in vertices_comprising])
             try:
-                route = arcpy.Polyline(route_vertices)
+                route = MHN.build_route_wkb(vertices_comprising, arcs_traversed_by[common_id])
                 routes_cursor.insertRow([route, common_id])
             except:
                 itin_delete_query = ''' "{0}" = '{1}' '''.format(common_id_field, common_id)
@@ -717,12 +716,14 @@ arcpy.AddMessage('-- ' + MHN.node + '...')
 arcpy.Delete_management(MHN.node)
 arcpy.CopyFeatures_management(new_nodes_CZ, MHN.node)
 arcpy.Delete_management(new_nodes_CZ)
+MHN.invalidate_attribute_cache(MHN.node)
 
 # Replace old arcs.
 arcpy.AddMessage('-- ' + MHN.arc + '...')
 arcpy.Delete_management(MHN.arc)
 arcpy.CopyFeatures_management(temp_arcs, MHN.arc)
 arcpy.Delete_management(temp_arcs)
+MHN.invalidate_attribute_cache(MHN.arc)
 
 # Rebuild relationship classes.
 arcpy.AddMessage('\nRebuilding relationship classes...')
@@ -8,34 +8,514 @@
     graph read in from a CSV. It is essentially a wrapper of the MHN module's
     find_shortest_path() function, to facilitate calls from SAS programs.
 
+    Single-gap mode (link_dict_txt is the windowed link dictionary written by
+    SAS, one "anode${bnode:cost,...}" row per anode):
+
+      shortest_path.py anode bnode link_dict_txt short_path_txt
+
+    Batch mode (all itinerary gaps solved by a single process, which loads the
+    network only once):
+
+      shortest_path.py --batch gap_requests_csv path_links_csv short_path_txt
+                       [--cache=cache_db] [--workers=n] [--graph=graph_file]
+                       [--errors=path_errors_txt] [--search=ft] [--window=n]
+
+    gap_requests_csv has one "anode,bnode" row per gap, and path_links_csv
+    has one "anode,bnode,cost,ax,ay,bx,by" row per directional link. Each gap
+    is searched on the links whose anode falls within a window around it:
+    the bounding box of its endpoints, extended by search * window feet
+    (5280 * 3 by default) on each side, unless the gap's row includes its
+    own "xmin,xmax,ymin,ymax" box. Windows are drawn from a grid index of
+    the node coordinates, and one result per gap is written to
+    short_path_txt, in request order. Gaps with no path are written as
+    "(0, [])", which SAS reports as path errors. Batch gaps are solved with
+    A* search, guided by the link coordinates, so the bounding box is only a
+    safety net rather than the main limit on the search. Gaps that share an
+    anode are solved together, with a single shortest-path tree.
+
+    Before any searching, gaps that plainly cannot have a path anywhere in
+    the network are identified from its weakly & strongly connected
+    components: those with an endpoint missing from the network, an anode
+    with no links leaving it, endpoints in unconnected parts of the network,
+    or a bnode that is upstream of the anode's component. This check is
+    partial (other gaps may still turn out to have no path when searched),
+    but the gaps it identifies get "(0, [])" straight away, and are also
+    listed (with the reason) in the optional path_errors_txt.
+
+    If the optional graph_file is given, the network is read from it (a
+    binary file that is memory-mapped rather than parsed, and shared by
+    worker processes), or saved there if graph_file is missing or was
+    written from a different version of path_links_csv.
+
+    If the optional cache_db is given, results are also saved to (and looked
+    up in) a SQLite database, keyed by a fingerprint of path_links_csv's
+    contents, so gaps already solved on an identical network in an earlier
+    run are not searched again.
+
+    If --workers is given (0 for one per CPU), large batches of gaps are
+    spread over that many worker processes. Results are still written in
+    request order.
+
+    Networks are held in a compact Graph object (compressed sparse row
+    arrays, with node IDs remapped to dense indices), rather than in a
+    dictionary of dictionaries. Dijkstra searches of networks whose link
+    costs are all small integers use a bucket queue instead of a binary heap.
+
 '''
 from __future__ import print_function
 import csv
+import hashlib
+import sqlite3
 import sys
 import heapq
-# Do NOT import MHN and call MHN.find_shortest_path()! Importing MHN for each
-# anode-bnode pair takes *forever* when run outside of ArcGIS (i.e. from SAS).
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+# The path finding lives here, not in MHN: MHN.find_shortest_path() just calls
+# this module's find_shortest_path(). (MHN no longer imports arcpy until it's
+# needed, but this module doesn't need MHN at all.)
+
+NO_PATH = (0, [])
+NAN = float('nan')
+CACHE_MAX_NETWORKS = 50  # Networks kept in a PathCache (least recently used are dropped)
+ASTAR_MAX_UNPLACED = 0.1  # Share of nodes without coordinates beyond which A* falls back to Dijkstra
+DIAL_MAX_WEIGHT = 100  # Integer-cost graphs with costlier links are searched with a binary heap (faster for them)
+PARALLEL_MIN_GAPS = 200  # Fewer gaps than this are not worth starting worker processes for
+GRAPH_FILE_VERSION = 1
+GRAPH_FILE_HEADER = struct.Struct('<8sIIII32s')  # Magic, version, node count, link count, flags, fingerprint
+GRID_CELL_SIZE = 5280.0  # Width & height of the Graph.window() spatial index cells (feet)
+SEARCH = 5280.0          # Default search distance (feet), as in the SAS programs...
+WINDOW = 3               # ...and its multiplier: gap windows extend SEARCH * WINDOW beyond both endpoints
+
 
 # -----------------------------------------------------------------------------
-#  Set parameters.
+#  Define network graph.
 # -----------------------------------------------------------------------------
-anode = sys.argv[1]
-bnode = sys.argv[2]
-link_dict_txt = sys.argv[3]
-short_path_txt = sys.argv[4]
-sys.setrecursionlimit(6000)  # Max. iterations (sys default = 1000)
+class Graph(object):
+    ''' A directed network graph in compressed sparse row (CSR) form. Node IDs
+        are remapped to dense indices 0..n-1 (node_ids[i] is the ID of index
+        i), and the out-links of index i occupy slots offsets[i] through
+        offsets[i+1]-1 of the targets (b-node indices) and weights (costs)
+        arrays. Optional x & y arrays hold node coordinates (NaN if unknown).
+        '''
+
+    def __init__(self, node_ids, offsets, targets, weights, x=None, y=None):
+        self.node_ids = node_ids
+        self.node_index = dict((node_id, i) for (i, node_id) in enumerate(node_ids))
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.x = x
+        self.y = y
+        self._grid = None
+        self._grid_extent = None
+        self._astar_bound = None
+        self._buckets = None
+        self._components = None
+        self._weak_components = None
+        self._weight_range = None
+        return None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node_id):
+        return node_id in self.node_index
+
+    @property
+    def link_count(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_links(cls, links, coords=None):
+        ''' Build a graph from an iterable of (anode, bnode, cost) tuples, and
+            an optional {node: (x, y)} dictionary of coordinates. If a link is
+            listed more than once, the last cost is kept (as when building a
+            graph dictionary). '''
+        link_costs = {}
+        for (anode, bnode, cost) in links:
+            link_costs[(anode, bnode)] = cost
+        node_set = set()
+        for (anode, bnode) in link_costs:
+            node_set.add(anode)
+            node_set.add(bnode)
+        if coords:
+            node_set.update(coords)
+        node_ids = sorted(node_set)
+        node_index = dict((node_id, i) for (i, node_id) in enumerate(node_ids))
+
+        # Integer costs (e.g. miles * 100) are stored as ints, others as doubles.
+        if all(isinstance(cost, int) for cost in link_costs.values()):
+            weight_type = 'l'
+        else:
+            weight_type = 'd'
+
+        offsets = array('l', [0] * (len(node_ids) + 1))
+        for (anode, bnode) in link_costs:
+            offsets[node_index[anode] + 1] += 1
+        for i in range(len(node_ids)):
+            offsets[i + 1] += offsets[i]
+        targets = array('l', [0] * len(link_costs))
+        weights = array(weight_type, [0] * len(link_costs))
+        next_slot = array('l', offsets[:-1])
+        for (anode, bnode) in sorted(link_costs):
+            a = node_index[anode]
+            slot = next_slot[a]
+            targets[slot] = node_index[bnode]
+            weights[slot] = link_costs[(anode, bnode)]
+            next_slot[a] += 1
+
+        x = y = None
+        if coords:
+            x = array('d', [NAN] * len(node_ids))
+            y = array('d', [NAN] * len(node_ids))
+            for (node_id, (node_x, node_y)) in coords.items():
+                i = node_index[node_id]
+                x[i] = node_x
+                y[i] = node_y
+        return cls(node_ids, offsets, targets, weights, x, y)
+
+    @classmethod
+    def from_dict(cls, graph):
+        ''' Build a graph from a dictionary of dictionaries (as used by the
+            original find_shortest_path()). '''
+        return cls.from_links(
+            (anode, bnode, cost)
+            for (anode, b_dict) in graph.items() for (bnode, cost) in b_dict.items()
+        )
+
+    @property
+    def weight_type(self):
+        ''' 'l' if link costs are integers, or 'd' if they are doubles. '''
+        code = getattr(self.weights, 'typecode', None) or self.weights.format
+        return 'd' if code in ('f', 'd') else 'l'
+
+    @property
+    def min_weight(self):
+        return self.weight_range[0]
+
+    @property
+    def max_weight(self):
+        return self.weight_range[1]
+
+    @property
+    def weight_range(self):
+        ''' (lowest, highest) link cost, or (0, 0) if there are no links. '''
+        if self._weight_range is None:
+            if self.weights:
+                self._weight_range = (min(self.weights), max(self.weights))
+            else:
+                self._weight_range = (0, 0)
+        return self._weight_range
+
+    @property
+    def astar_bound(self):
+        ''' A (ratio, offset) pair for A* heuristics: ratio * straight-line
+            distance - offset never exceeds the cost of a path, so heuristics
+            scaled this way never overestimate.
+
+            ratio is the lowest ratio of link cost to straight-line link length
+            among the links with a positive cost & coordinates at both ends
+            (nominally 100/5280 for miles*100 costs & coordinates in feet).
+            Links between nodes with coordinates that cost less than ratio
+            allows (e.g. short links whose costs were truncated to 0), and the
+            cheapest connections through nodes without coordinates, where they
+            cost less, are skipped: offset is ratio * their total length, the
+            most that skipping them can let a heuristic overestimate by.
+
+            (0, 0), i.e. no heuristic, if the graph has no coordinates, or more
+            than ASTAR_MAX_UNPLACED of its nodes lack them (a warning is
+            printed in that case). '''
+        if self._astar_bound is None:
+            self._astar_bound = (0.0, 0.0)
+            if self.x is not None and len(self):
+                from math import hypot
+                x, y, offsets, targets, weights = self.x, self.y, self.offsets, self.targets, self.weights
+                unplaced = bytearray(1 if x[i] != x[i] or y[i] != y[i] else 0 for i in range(len(self)))
+                unplaced_count = sum(unplaced)
+                if unplaced_count > ASTAR_MAX_UNPLACED * len(self):
+                    print('WARNING: {0} of {1} nodes have no coordinates, so A* heuristics are disabled.'.format(
+                        unplaced_count, len(self)))
+                    return self._astar_bound
+
+                # Connections (cost, distance) between nodes with coordinates:
+                # links, and the cheapest paths through nodes without them.
+                connections = []
+                for i in range(len(self)):
+                    if unplaced[i]:
+                        continue
+                    bridges = {}
+                    for slot in range(offsets[i], offsets[i + 1]):
+                        j = targets[slot]
+                        if not unplaced[j]:
+                            connections.append((weights[slot], hypot(x[j] - x[i], y[j] - y[i])))
+                        elif weights[slot] < bridges.get(j, float('inf')):
+                            bridges[j] = weights[slot]
+                    if bridges:
+                        # Dijkstra search confined to nodes without coordinates.
+                        queue = [(cost, j) for (j, cost) in bridges.items()]
+                        heapq.heapify(queue)
+                        settled = set()
+                        reached = {}
+                        while queue:
+                            (cost, j) = heapq.heappop(queue)
+                            if j in settled:
+                                continue
+                            settled.add(j)
+                            for slot in range(offsets[j], offsets[j + 1]):
+                                k = targets[slot]
+                                if unplaced[k]:
+                                    if k not in settled:
+                                        heapq.heappush(queue, (cost + weights[slot], k))
+                                elif k != i and cost + weights[slot] < reached.get(k, float('inf')):
+                                    reached[k] = cost + weights[slot]
+                        connections.extend((cost, hypot(x[k] - x[i], y[k] - y[i])) for (k, cost) in reached.items())
+
+                ratio = min([cost / float(distance) for (cost, distance) in connections if cost > 0 and distance > 0] or [0.0])
+                if ratio == 0:
+                    print('WARNING: no links have both a cost & a length, so A* heuristics are disabled.')
+                    return self._astar_bound
+                skipped = sum(distance for (cost, distance) in connections if cost < ratio * distance)
+                self._astar_bound = (ratio, ratio * skipped)
+        return self._astar_bound
+
+    @property
+    def components(self):
+        ''' An array of strongly connected component labels, one per node
+            index: two nodes have the same label if and only if each can be
+            reached from the other. Labels are numbered in reverse topological
+            order (Tarjan's algorithm), so a node can never reach a node whose
+            component has a higher label. '''
+        if self._components is None:
+            n = len(self)
+            offsets, targets = self.offsets, self.targets
+            label = array('l', [-1]) * n
+            order = array('l', [-1]) * n  # Visit order of each node
+            low = array('l', [0]) * n     # Lowest visit order reachable within the DFS subtree
+            on_stack = bytearray(n)
+            stack = []
+            next_order = 0
+            next_label = 0
+            for root in range(n):
+                if order[root] != -1:
+                    continue
+                # Iterative DFS: each frame is [node index, next out-link slot].
+                order[root] = low[root] = next_order
+                next_order += 1
+                stack.append(root)
+                on_stack[root] = 1
+                frames = [[root, offsets[root]]]
+                while frames:
+                    frame = frames[-1]
+                    i = frame[0]
+                    if frame[1] < offsets[i + 1]:
+                        j = targets[frame[1]]
+                        frame[1] += 1
+                        if order[j] == -1:
+                            order[j] = low[j] = next_order
+                            next_order += 1
+                            stack.append(j)
+                            on_stack[j] = 1
+                            frames.append([j, offsets[j]])
+                        elif on_stack[j] and order[j] < low[i]:
+                            low[i] = order[j]
+                        continue
+                    frames.pop()
+                    if frames and low[i] < low[frames[-1][0]]:
+                        low[frames[-1][0]] = low[i]
+                    if low[i] == order[i]:
+                        while True:
+                            j = stack.pop()
+                            on_stack[j] = 0
+                            label[j] = next_label
+                            if j == i:
+                                break
+                        next_label += 1
+            self._components = label
+        return self._components
+
+    @property
+    def weak_components(self):
+        ''' An array of weakly connected component labels, one per node index:
+            two nodes have the same label if and only if they are joined by a
+            chain of links, whatever their direction. Nodes with different
+            labels can never reach each other. '''
+        if self._weak_components is None:
+            n = len(self)
+            offsets, targets = self.offsets, self.targets
+            parent = array('l', range(n))  # Union-find forest of node indices
+            for i in range(n):
+                for slot in range(offsets[i], offsets[i + 1]):
+                    a = i
+                    while parent[a] != a:
+                        parent[a] = parent[parent[a]]
+                        a = parent[a]
+                    b = targets[slot]
+                    while parent[b] != b:
+                        parent[b] = parent[parent[b]]
+                        b = parent[b]
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+            for i in range(n):
+                parent[i] = parent[parent[i]]  # Roots have lower indices, so one pass resolves all
+            self._weak_components = parent
+        return self._weak_components
+
+    def neighbors(self, i):
+        ''' Iterate over (b-node index, cost) pairs for the out-links of node
+            index i. '''
+        for slot in range(self.offsets[i], self.offsets[i + 1]):
+            yield self.targets[slot], self.weights[slot]
+
+    def window(self, xmin, xmax, ymin, ymax):
+        ''' Return a bytearray flagging the node indices within a bounding box
+            (nodes without coordinates are never within it), using a uniform
+            grid index of the node coordinates. Nodes in grid cells entirely
+            within the box are flagged without checking their coordinates. '''
+        if self._grid is None:
+            self._grid = {}
+            for i in range(len(self) if self.x is not None else 0):
+                if self.x[i] == self.x[i] and self.y[i] == self.y[i]:
+                    cell = (cell_index(self.x[i]), cell_index(self.y[i]))
+                    self._grid.setdefault(cell, array('l')).append(i)
+            if self._grid:
+                self._grid_extent = (
+                    min(cx for (cx, cy) in self._grid), max(cx for (cx, cy) in self._grid),
+                    min(cy for (cx, cy) in self._grid), max(cy for (cx, cy) in self._grid)
+                )
+        in_window = bytearray(len(self))
+        if not self._grid or xmin > xmax or ymin > ymax:
+            return in_window
+        cx_min = max(cell_index(xmin), self._grid_extent[0])
+        cx_max = min(cell_index(xmax), self._grid_extent[1])
+        cy_min = max(cell_index(ymin), self._grid_extent[2])
+        cy_max = min(cell_index(ymax), self._grid_extent[3])
+        x, y = self.x, self.y
+        for cx in range(cx_min, cx_max + 1):
+            x_inside = xmin <= cx * GRID_CELL_SIZE and (cx + 1) * GRID_CELL_SIZE <= xmax
+            for cy in range(cy_min, cy_max + 1):
+                nodes = self._grid.get((cx, cy))
+                if nodes is None:
+                    continue
+                if x_inside and ymin <= cy * GRID_CELL_SIZE and (cy + 1) * GRID_CELL_SIZE <= ymax:
+                    for i in nodes:
+                        in_window[i] = 1
+                else:
+                    for i in nodes:
+                        if xmin <= x[i] <= xmax and ymin <= y[i] <= ymax:
+                            in_window[i] = 1
+        return in_window
+
+    def gap_window(self, anode, bnode, buffer=SEARCH * WINDOW):
+        ''' The search window (xmin, xmax, ymin, ymax) for a gap: the bounding
+            box of its endpoints, extended by buffer on each side and rounded
+            (as formerly calculated by SAS). Endpoints without coordinates are
+            ignored; if neither has any, the window is unlimited. '''
+        points = []
+        for node in (anode, bnode):
+            i = self.node_index.get(node)
+            if i is not None and self.x is not None and self.x[i] == self.x[i] and self.y[i] == self.y[i]:
+                points.append((self.x[i], self.y[i]))
+        if not points:
+            return (-float('inf'), float('inf'), -float('inf'), float('inf'))
+        return (
+            sas_round(min(point[0] for point in points) - buffer),
+            sas_round(max(point[0] for point in points) + buffer),
+            sas_round(min(point[1] for point in points) - buffer),
+            sas_round(max(point[1] for point in points) + buffer)
+        )
+
+
+def cell_index(coord):
+    ''' Index of the Graph.window() grid cells containing a coordinate,
+        clamped so that infinite coordinates can be used. '''
+    return int(math.floor(max(min(coord, 1e15), -1e15) / GRID_CELL_SIZE))
+
+
+def sas_round(value):
+    ''' Round a float to the nearest integer value (halves away from zero),
+        as SAS's round() does. '''
+    return math.copysign(math.floor(abs(value) + 0.5), value)
+
+
+# -----------------------------------------------------------------------------
+#  Define path cache.
+# -----------------------------------------------------------------------------
+class PathCache(object):
+    ''' A SQLite database of gap results, keyed by network fingerprint (see
+        file_fingerprint()), anode, bnode & search window. Results for other
+        networks are kept, so that alternating between scenario networks does
+        not discard them, but only the CACHE_MAX_NETWORKS most recently used
+        networks' results are retained. '''
+
+    def __init__(self, cache_db, fingerprint):
+        self.cache_db = cache_db
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(cache_db)
+        with self.connection:
+            self.connection.execute(
+                '''CREATE TABLE IF NOT EXISTS networks (
+                       fingerprint TEXT PRIMARY KEY, last_used REAL)''')
+            self.connection.execute(
+                '''CREATE TABLE IF NOT EXISTS paths (
+                       fingerprint TEXT, anode INTEGER, bnode INTEGER, window TEXT,
+                       cost NUMERIC, path TEXT,
+                       PRIMARY KEY (fingerprint, anode, bnode, window))''')
+            self.connection.execute(
+                'INSERT OR REPLACE INTO networks VALUES (?, ?)', (fingerprint, time.time()))
+            stale = [row[0] for row in self.connection.execute(
+                'SELECT fingerprint FROM networks ORDER BY last_used DESC LIMIT -1 OFFSET ?',
+                (CACHE_MAX_NETWORKS,))]
+            for old_fingerprint in stale:
+                self.connection.execute('DELETE FROM paths WHERE fingerprint = ?', (old_fingerprint,))
+                self.connection.execute('DELETE FROM networks WHERE fingerprint = ?', (old_fingerprint,))
+        return None
+
+    @staticmethod
+    def window_key(gap):
+        return '{0!r},{1!r},{2!r},{3!r}'.format(*gap[2:6])
+
+    def get(self, gap):
+        ''' Return the cached (cost, path) tuple for a gap, or None. '''
+        row = self.connection.execute(
+            'SELECT cost, path FROM paths WHERE fingerprint = ? AND anode = ? AND bnode = ? AND window = ?',
+            (self.fingerprint, gap[0], gap[1], self.window_key(gap))).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        path = [int(node) for node in row[1].split(',')] if row[1] else []
+        return row[0], path
+
+    def put_many(self, gap_results):
+        ''' Save an iterable of (gap, (cost, path)) pairs. '''
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO paths VALUES (?, ?, ?, ?, ?, ?)',
+                ((self.fingerprint, gap[0], gap[1], self.window_key(gap), result[0], ','.join(str(node) for node in result[1]))
+                 for (gap, result) in gap_results))
+        return None
+
+    def close(self):
+        self.connection.close()
+        return None
 
 
 # -----------------------------------------------------------------------------
 #  Find shortest path.
 # -----------------------------------------------------------------------------
-# Use copy of find_shortest_path() from MHN.py to avoid costly arcpy imports:
-def find_shortest_path(graph, start, end):
-    ''' Recursive function written by Chris Laffra to find shortest path
-        between 2 nodes in a graph; implementation of Dijkstra's algorithm.
-        Based on <http://code.activestate.com/recipes/119466/#c6>.
+def find_shortest_path(graph, start, end, in_window=None):
+    ''' Find the shortest path between 2 nodes in a graph, using Dijkstra's
+        algorithm. Originally a recursive function written by Chris Laffra,
+        based on <http://code.activestate.com/recipes/119466/#c6>.
 
-        Example graph dictionary (sub-dicts contain distances):
+        The graph may be a Graph object, or a dictionary whose sub-dicts
+        contain distances, e.g.:
 
             {'a': {'w': 14, 'x': 7, 'y': 9},
              'b': {'w': 9, 'z': 6},
@@ -43,29 +523,693 @@ def find_shortest_path(graph, start, end):
              'x': {'a': 7, 'y': 10, 'z': 15},
              'y': {'a': 9, 'w': 2, 'x': 10, 'z': 11},
              'z': {'b': 6, 'x': 15, 'y': 11}}
+
+        If in_window (a bytearray from Graph.window()) is given, only the
+        out-links of flagged nodes are used. Returns a (cost, [nodes]) tuple,
+        or None if end cannot be reached from start.
     '''
-    queue = [(0, start, [])]
-    seen = set()
+    if not isinstance(graph, Graph):
+        graph = Graph.from_dict(graph)
+    if start == end:
+        return 0, [start]
+    if start not in graph or end not in graph:
+        return None
+    t = graph.node_index[end]
+    pred = array('l', [-1]) * len(graph)
+    for (p_cost, i) in settle_nodes(graph, graph.node_index[start], pred, in_window):
+        if i == t:
+            return p_cost, [graph.node_ids[j] for j in trace_path(pred, t)]
+    return None
+
+
+def find_shortest_path_astar(graph, start, end, in_window=None):
+    ''' Find the shortest path between 2 nodes in a Graph with node
+        coordinates, using A* search. The heuristic is the straight-line
+        distance to end, scaled & reduced by graph.astar_bound so that it never
+        exceeds the true remaining cost (0 for nodes without coordinates), so
+        the path cost is the same as find_shortest_path()'s. Far fewer nodes
+        are settled, though where several paths tie for shortest, a different
+        one of them may be returned. (Where links were skipped by astar_bound,
+        the heuristic may not be consistent, so a settled node is reopened if
+        a cheaper path to it turns up later.)
+
+        Falls back to find_shortest_path() when the graph has no usable
+        coordinates. Arguments & return value are as for
+        find_shortest_path(). '''
+    if not isinstance(graph, Graph):
+        graph = Graph.from_dict(graph)
+    (ratio, offset) = graph.astar_bound
+    t = graph.node_index.get(end)
+    if start == end or not ratio or t is None or graph.x[t] != graph.x[t]:
+        return find_shortest_path(graph, start, end, in_window)
+    if start not in graph:
+        return None
+    from math import hypot
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    x, y, node_ids = graph.x, graph.y, graph.node_ids
+    t_x, t_y = x[t], y[t]
+    s = graph.node_index[start]
+
+    cost = {s: 0}
+    pred = array('l', [-1]) * len(graph)
+    seen = bytearray(len(graph))
+    queue = [(0, s)]
+    while queue:
+        i = heapq.heappop(queue)[1]
+        if seen[i]:
+            continue
+        seen[i] = 1
+        p_cost = cost[i]
+        if i == t:
+            return p_cost, [node_ids[j] for j in trace_path(pred, t)]
+        if in_window is not None and not in_window[i]:
+            continue
+        for slot in range(offsets[i], offsets[i + 1]):
+            j = targets[slot]
+            b_cost = p_cost + weights[slot]
+            j_cost = cost.get(j)
+            if j_cost is None or b_cost < j_cost:
+                cost[j] = b_cost
+                pred[j] = i
+                seen[j] = 0
+                h = ratio * hypot(x[j] - t_x, y[j] - t_y) - offset
+                if not h > 0:  # Also catches NaN, for nodes without coordinates
+                    h = 0
+                heapq.heappush(queue, (b_cost + h, j))
+            elif seen[j]:
+                continue
+            elif b_cost == j_cost and path_precedes(pred, i, pred[j]):
+                pred[j] = i
+    return None
+
+
+def find_shortest_path_tree(graph, start, ends, in_window=None):
+    ''' Find the shortest paths from one node to several others, growing a
+        single Dijkstra tree until every reachable end node is settled. The
+        paths (including the choice between equal-cost paths) are the same
+        as find_shortest_path() would return for each pair. Returns a
+        {end: (cost, [nodes]) or None} dictionary. '''
+    if not isinstance(graph, Graph):
+        graph = Graph.from_dict(graph)
+    results = dict((end, None) for end in ends)
+    if start not in graph:
+        if start in results:
+            results[start] = (0, [start])
+        return results
+    node_ids = graph.node_ids
+    remaining = set(graph.node_index[end] for end in ends if end in graph)
+    if not remaining:
+        return results
+    pred = array('l', [-1]) * len(graph)
+    for (p_cost, i) in settle_nodes(graph, graph.node_index[start], pred, in_window):
+        if i in remaining:
+            remaining.remove(i)
+            results[node_ids[i]] = (p_cost, [node_ids[j] for j in trace_path(pred, i)])
+            if not remaining:
+                break
+    return results
+
+
+def settle_nodes(graph, s, pred, in_window=None):
+    ''' Generate (cost, node index) pairs for the nodes of a Graph in the
+        order that Dijkstra's algorithm settles them, starting from node
+        index s, and filling in the pred array of predecessor indices as it
+        goes. Ties between equal-cost predecessors go to the
+        lexicographically smaller path, as when whole paths were compared in
+        the queue. If in_window is given, only the out-links of flagged nodes
+        are used.
+
+        Graphs whose link costs are all integers up to DIAL_MAX_WEIGHT use a
+        bucket queue (Dial's algorithm), which only beats a binary heap when
+        there are few buckets to step through; others use the heap. Nodes are
+        settled in the same order either way. '''
+    if graph.weight_type == 'l' and 0 <= graph.min_weight and graph.max_weight <= DIAL_MAX_WEIGHT:
+        return settle_nodes_dial(graph, s, pred, in_window)
+    return settle_nodes_heap(graph, s, pred, in_window)
+
+
+def settle_nodes_heap(graph, s, pred, in_window=None):
+    ''' settle_nodes() with a binary heap of (cost, node index) entries. '''
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    cost = {s: 0}
+    seen = bytearray(len(graph))
+    queue = [(0, s)]
+    while queue:
+        (p_cost, i) = heapq.heappop(queue)
+        if seen[i]:
+            continue
+        seen[i] = 1
+        yield p_cost, i
+        if in_window is not None and not in_window[i]:
+            continue
+        for slot in range(offsets[i], offsets[i + 1]):
+            j = targets[slot]
+            if seen[j]:
+                continue
+            b_cost = p_cost + weights[slot]
+            j_cost = cost.get(j)
+            if j_cost is None or b_cost < j_cost:
+                cost[j] = b_cost
+                pred[j] = i
+                heapq.heappush(queue, (b_cost, j))
+            elif b_cost == j_cost and path_precedes(pred, i, pred[j]):
+                pred[j] = i
+
+
+def settle_nodes_dial(graph, s, pred, in_window=None):
+    ''' settle_nodes() with a bucket queue, for non-negative integer costs.
+        Every queued cost is within max_weight of the cost being settled, so
+        max_weight + 1 buckets are reused in rotation. Each bucket is a heap
+        of bare node indices, so that nodes of equal cost are settled in the
+        same order as by settle_nodes_heap().
+
+        The buckets are allocated once per Graph and reused by each search,
+        which empties the ones it used when it finishes (or is abandoned). '''
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    heappush, heappop = heapq.heappush, heapq.heappop
+    cost = {s: 0}
+    seen = bytearray(len(graph))
+    bucket_count = graph.max_weight + 1
+    (buckets, graph._buckets) = (graph._buckets, None)  # Taken while in use, in case of nested searches
+    if buckets is None:
+        buckets = [[] for k in range(bucket_count)]
+    used = [0]  # Indices of buckets that may hold leftover entries
+    buckets[0].append(s)
+    queued = 1
+    p_cost = 0
+    try:
+        while queued:
+            bucket = buckets[p_cost % bucket_count]
+            while bucket:
+                i = heappop(bucket)
+                queued -= 1
+                if seen[i]:
+                    continue
+                seen[i] = 1
+                yield p_cost, i
+                if in_window is not None and not in_window[i]:
+                    continue
+                for slot in range(offsets[i], offsets[i + 1]):
+                    j = targets[slot]
+                    if seen[j]:
+                        continue
+                    b_cost = p_cost + weights[slot]
+                    j_cost = cost.get(j)
+                    if j_cost is None or b_cost < j_cost:
+                        cost[j] = b_cost
+                        pred[j] = i
+                        k = b_cost % bucket_count
+                        if not buckets[k]:
+                            used.append(k)
+                        heappush(buckets[k], j)
+                        queued += 1
+                    elif b_cost == j_cost and path_precedes(pred, i, pred[j]):
+                        pred[j] = i
+            p_cost += 1
+    finally:
+        if queued:
+            for k in used:
+                del buckets[k][:]
+        graph._buckets = buckets
+
+
+def unreachable_reason(graph, start, end):
+    ''' Check whether end can possibly be reached from start in a Graph,
+        using its weakly & strongly connected components rather than a
+        search. Returns a description of why it cannot, or None if that can't
+        be ruled out this way (i.e. a search is needed, though it may still
+        find no path). '''
+    if start == end:
+        return None
+    if start not in graph:
+        return 'anode {0} is not in the network'.format(start)
+    if end not in graph:
+        return 'bnode {0} is not in the network'.format(end)
+    s = graph.node_index[start]
+    t = graph.node_index[end]
+    if graph.offsets[s] == graph.offsets[s + 1]:
+        return 'anode {0} has no links leaving it'.format(start)
+    if graph.weak_components[s] != graph.weak_components[t]:
+        return 'bnode {0} is not connected to anode {1}'.format(end, start)
+    components = graph.components
+    if components[s] < components[t]:
+        return 'bnode {0} cannot be reached from anode {1} (components {2} & {3})'.format(
+            end, start, components[s], components[t])
+    return None
+
+
+def path_precedes(pred, a, b):
+    ''' Check whether the path ending at node index a comes before the path
+        ending at node index b, i.e. trace_path(pred, a) < trace_path(pred, b),
+        which breaks ties between equal-cost paths. Rather than tracing both
+        paths, they are walked back together only as far as the node where
+        they branch, and the nodes after it compared. '''
+    if a == b:
+        return False
+    next_a = {a: -1}  # Node following each node on the path to a (-1 at its end)
+    next_b = {b: -1}
+    (i, j) = (a, b)
     while True:
-        (p_cost, node, path) = heapq.heappop(queue)
-        if node not in seen:
-            path = path + [node]
-            seen.add(node)
-            if node == end:
-                return p_cost, path
-            if node in graph.keys():
-                for (b_node, b_cost) in graph[node].iteritems():
-                    heapq.heappush(queue, (p_cost + b_cost, b_node, path))
-
-graph = {}
-reader = csv.reader(open(link_dict_txt), delimiter='$')
-for row in reader:
-    graph[eval(row[0])] = eval(row[1]) # Assign key/value pairs
-
-print('Finding shortest path from {0} to {1}...'.format(anode, bnode))
-
-short_path = open(short_path_txt, 'a')
-short_path.write(str(find_shortest_path(graph, eval(anode), eval(bnode))) + '\n')
-short_path.close()
-
-print('DONE')
+        if i in next_b:
+            break
+        if j in next_a:
+            i = j
+            break
+        if i != -1:
+            if pred[i] != -1:
+                next_a[pred[i]] = i
+            i = pred[i]
+        if j != -1:
+            if pred[j] != -1:
+                next_b[pred[j]] = j
+            j = pred[j]
+    (after_a, after_b) = (next_a[i], next_b[i])
+    if after_a == -1:
+        return True  # The path to a is a prefix of the path to b
+    if after_b == -1:
+        return False
+    return after_a < after_b
+
+
+def trace_path(pred, i):
+    ''' Trace the path ending at node index i back through an array of
+        predecessor indices (-1 for the origin), returning it in travel
+        order. '''
+    path = []
+    while i != -1:
+        path.append(i)
+        i = pred[i]
+    path.reverse()
+    return path
+
+
+# -----------------------------------------------------------------------------
+#  Read network & gap files.
+# -----------------------------------------------------------------------------
+def file_fingerprint(path):
+    ''' MD5 hash of a file's contents, identifying a network version. '''
+    md5 = hashlib.md5()
+    with open(path, 'rb') as reader:
+        for chunk in iter(lambda: reader.read(1 << 20), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def parse_coord(value):
+    ''' Convert a coordinate string to a float (NaN if SAS missing value). '''
+    try:
+        return float(value)
+    except ValueError:
+        return NAN
+
+
+def read_link_dictionary(link_dict_txt):
+    ''' Read a $-delimited link dictionary file (as written by SAS, with rows
+        like "5001${5002:45,5003:112}") into a Graph, without eval(). '''
+    links = []
+    with open(link_dict_txt) as reader:
+        for row in csv.reader(reader, delimiter='$'):
+            if not row:
+                continue
+            anode = int(row[0])
+            for pair in row[1].strip().strip('{}').split(','):
+                bnode, cost = pair.split(':')
+                links.append((anode, int(bnode), int(cost)))
+    return Graph.from_links(links)
+
+
+def read_path_links(path_links_csv):
+    ''' Read a CSV of directional links with "anode,bnode,cost,ax,ay,bx,by"
+        rows (as written by SAS) into a Graph, with node coordinates. '''
+    links = []
+    coords = {}
+    with open(path_links_csv) as reader:
+        for row in csv.reader(reader):
+            if not row:
+                continue
+            anode, bnode, cost = int(row[0]), int(row[1]), int(float(row[2]))
+            links.append((anode, bnode, cost))
+            coords[anode] = (parse_coord(row[3]), parse_coord(row[4]))
+            if len(row) >= 7 and bnode not in coords:
+                coords[bnode] = (parse_coord(row[5]), parse_coord(row[6]))
+    return Graph.from_links(links, coords)
+
+
+def read_network_csv(network_csv, nodes_csv=None, base_only=True):
+    ''' Read an MHN arc export with ANODE, BNODE, DIRECTIONS, MILES (and
+        optionally BASELINK) columns, such as network.csv, into a Graph whose
+        costs are miles * 100. Arcs with DIRECTIONS > 1 get a link in each
+        direction. Coordinates are read from an optional NODE, POINT_X,
+        POINT_Y export (i.e. nodes.csv). '''
+    links = []
+    with open(network_csv) as reader:
+        for row in csv.DictReader(reader):
+            if base_only and row.get('BASELINK', '1') not in ('1', '1.0'):
+                continue
+            anode, bnode = int(row['ANODE']), int(row['BNODE'])
+            cost = int(float(row['MILES']) * 100)
+            links.append((anode, bnode, cost))
+            if int(float(row['DIRECTIONS'])) > 1:
+                links.append((bnode, anode, cost))
+    coords = None
+    if nodes_csv:
+        coords = {}
+        with open(nodes_csv) as reader:
+            for row in csv.DictReader(reader):
+                coords[int(row['NODE'])] = (parse_coord(row['POINT_X']), parse_coord(row['POINT_Y']))
+    return Graph.from_links(links, coords)
+
+
+def write_graph_file(graph, graph_file, fingerprint=''):
+    ''' Write a Graph to a binary file that read_graph_file() can map into
+        memory, rather than parsing. After a header (see GRAPH_FILE_HEADER)
+        come the node IDs, offsets, targets & weights arrays and, if the graph
+        has coordinates, the x & y arrays: all little-endian, int32 (weights
+        float64 if not integers) or float64 for coordinates, with each array
+        padded to a multiple of 8 bytes. The fingerprint (see
+        file_fingerprint()) identifies the file that the graph was read from.
+        '''
+    flags = int(graph.weight_type == 'l') | int(graph.x is not None) << 1
+    sections = [
+        array('i', graph.node_ids), array('i', graph.offsets), array('i', graph.targets),
+        array('i' if flags & 1 else 'd', graph.weights)
+    ]
+    if graph.x is not None:
+        sections += [array('d', graph.x), array('d', graph.y)]
+    with open(graph_file, 'wb') as writer:
+        writer.write(GRAPH_FILE_HEADER.pack(
+            b'MHNGRAPH', GRAPH_FILE_VERSION, len(graph), graph.link_count, flags, fingerprint.encode('ascii')))
+        for section in sections:
+            if sys.byteorder != 'little':
+                section.byteswap()
+            section.tofile(writer)
+            writer.write(b'\0' * (-len(section) * section.itemsize % 8))
+    return graph_file
+
+
+def read_graph_file(graph_file, fingerprint=None):
+    ''' Read a Graph from a file written by write_graph_file(). Returns None
+        if the file is from a different version of this module, or (if a
+        fingerprint is given) was written from a different network file.
+
+        The file is memory-mapped, and the Graph's arrays are views of it, so
+        processes reading the same file share its pages. (In Python 2, or on
+        big-endian machines, the arrays are copied instead.) '''
+    with open(graph_file, 'rb') as reader:
+        header = reader.read(GRAPH_FILE_HEADER.size)
+        if len(header) < GRAPH_FILE_HEADER.size:
+            return None
+        (magic, version, node_count, link_count, flags, file_fingerprint) = GRAPH_FILE_HEADER.unpack(header)
+        if magic != b'MHNGRAPH' or version != GRAPH_FILE_VERSION:
+            return None
+        if fingerprint is not None and file_fingerprint.rstrip(b'\0').decode('ascii') != fingerprint:
+            return None
+        mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+    shared = hasattr(memoryview, 'cast') and sys.byteorder == 'little'
+    sections = []
+    position = GRAPH_FILE_HEADER.size
+    layout = [('i', node_count), ('i', node_count + 1), ('i', link_count), ('i' if flags & 1 else 'd', link_count)]
+    if flags & 2:
+        layout += [('d', node_count), ('d', node_count)]
+    for (typecode, count) in layout:
+        size = count * array(typecode).itemsize
+        if shared:
+            section = memoryview(mapped)[position:position + size].cast(typecode)
+        else:
+            section = array(typecode)
+            (getattr(section, 'frombytes', None) or section.fromstring)(mapped[position:position + size])
+            if sys.byteorder != 'little':
+                section.byteswap()
+        sections.append(section)
+        position += size + (-size % 8)
+    if not shared:
+        mapped.close()
+    if not flags & 2:
+        sections += [None, None]
+    return Graph(*sections)
+
+
+def load_graph(graph_file, path_links_csv):
+    ''' Read the Graph saved in graph_file if it was written from the current
+        contents of path_links_csv; otherwise read path_links_csv and save its
+        Graph to graph_file. '''
+    fingerprint = file_fingerprint(path_links_csv)
+    if os.path.exists(graph_file):
+        graph = read_graph_file(graph_file, fingerprint)
+        if graph is not None:
+            return graph
+    graph = read_path_links(path_links_csv)
+    write_graph_file(graph, graph_file, fingerprint)
+    return graph
+
+
+def read_gap_requests(gap_requests_csv, graph=None, buffer=SEARCH * WINDOW):
+    ''' Read a CSV of itinerary gaps with "anode,bnode[,xmin,xmax,ymin,ymax]"
+        rows, returning a list of (anode, bnode, xmin, xmax, ymin, ymax)
+        tuples in file order. Rows without a bounding box are given the
+        graph's gap_window() for their endpoints. '''
+    gaps = []
+    with open(gap_requests_csv) as reader:
+        for row in csv.reader(reader):
+            if not row:
+                continue
+            anode, bnode = int(row[0]), int(row[1])
+            if len(row) >= 6:
+                xmin, xmax, ymin, ymax = (float(coord) for coord in row[2:6])
+            else:
+                xmin, xmax, ymin, ymax = graph.gap_window(anode, bnode, buffer)
+            gaps.append((anode, bnode, xmin, xmax, ymin, ymax))
+    return gaps
+
+
+# -----------------------------------------------------------------------------
+#  Solve gaps & write output.
+# -----------------------------------------------------------------------------
+def solve_gap_requests(graph, gaps, search=find_shortest_path_astar, group_origins=True, cache=None,
+                       workers=1, graph_loader=None, unreachable=None):
+    ''' Find the shortest path for each gap, using the links whose anode is
+        within its bounding box. Returns one (cost, path) tuple per gap, in
+        request order.
+
+        Gaps that cannot have a path anywhere in the graph (see
+        find_unreachable_gaps(), whose result can be passed as unreachable if
+        the caller has already computed it) get NO_PATH without being
+        searched.
+
+        If a PathCache is given, cached results are used where available, and
+        any newly solved gaps are added to it.
+
+        The remaining gaps are searched on their windows (see
+        solve_windowed_gaps()). If workers > 1 and there are enough of them,
+        they are spread over a pool of worker processes: see
+        solve_windowed_gaps_parallel() for graph_loader. '''
+    results = [None] * len(gaps)
+    if unreachable is None:
+        unreachable = find_unreachable_gaps(graph, gaps)
+    for (n, reason) in unreachable:
+        results[n] = NO_PATH
+    if cache is not None:
+        results = [result or cache.get(gap) for (result, gap) in zip(results, gaps)]
+        unsolved = [n for (n, result) in enumerate(results) if result is None]
+    numbered_gaps = [(n, gap) for (n, gap) in enumerate(gaps) if results[n] is None]
+    if workers > 1 and len(numbered_gaps) >= PARALLEL_MIN_GAPS:
+        solved = solve_windowed_gaps_parallel(graph, numbered_gaps, workers, search, group_origins, graph_loader)
+    else:
+        solved = solve_windowed_gaps(graph, numbered_gaps, search, group_origins)
+    for (n, result) in solved:
+        results[n] = result
+
+    if cache is not None:
+        cache.put_many((gaps[n], results[n]) for n in unsolved)
+    return results
+
+
+def find_unreachable_gaps(graph, gaps):
+    ''' List (n, reason) pairs for the gaps whose bnode cannot be reached
+        from their anode in the whole graph (see unreachable_reason()). '''
+    unreachable = []
+    for (n, gap) in enumerate(gaps):
+        reason = unreachable_reason(graph, gap[0], gap[1])
+        if reason is not None:
+            unreachable.append((n, reason))
+    return unreachable
+
+
+def solve_windowed_gaps(graph, numbered_gaps, search=find_shortest_path_astar, group_origins=True):
+    ''' Search for the shortest path of each gap in a list of (n, gap) pairs
+        on its own window, returning a list of (n, (cost, path)) pairs.
+
+        With group_origins, gaps sharing an anode are solved together with a
+        single shortest-path tree, grown on the bounding box of all of their
+        windows. Each path found this way that stays within its own gap's
+        window is also that gap's shortest path; any others are re-solved
+        individually with search(). '''
+    results = {}
+    origin_groups = {}
+    for (n, gap) in numbered_gaps:
+        origin_groups.setdefault(gap[0], []).append((n, gap))
+
+    for (anode, group) in origin_groups.items():
+        if group_origins and len(group) > 1:
+            xmin = min(gap[2] for (n, gap) in group)
+            xmax = max(gap[3] for (n, gap) in group)
+            ymin = min(gap[4] for (n, gap) in group)
+            ymax = max(gap[5] for (n, gap) in group)
+            in_window = graph.window(xmin, xmax, ymin, ymax)
+            tree = find_shortest_path_tree(graph, anode, [gap[1] for (n, gap) in group], in_window)
+            for (n, gap) in group:
+                result = tree[gap[1]]
+                if result and path_in_window(graph, result[1][:-1], *gap[2:6]):
+                    results[n] = result
+        for (n, gap) in group:
+            if n not in results:
+                (anode, bnode, xmin, xmax, ymin, ymax) = gap
+                in_window = graph.window(xmin, xmax, ymin, ymax)
+                results[n] = search(graph, anode, bnode, in_window) or NO_PATH
+    return [(n, results[n]) for (n, gap) in numbered_gaps]
+
+
+def solve_windowed_gaps_parallel(graph, numbered_gaps, workers, search=find_shortest_path_astar,
+                                 group_origins=True, graph_loader=None):
+    ''' As solve_windowed_gaps(), but spread over a pool of worker processes,
+        each of which solves whole origin groups. Results are returned in the
+        same order as numbered_gaps.
+
+        Where processes are forked, workers inherit the already-loaded graph.
+        Otherwise (i.e. on Windows) each worker loads its own copy by calling
+        graph_loader, a (function, args) tuple such as
+        (read_path_links, (path_links_csv,)), which is then required. '''
+    import multiprocessing
+    global _worker_graph
+
+    # Deal origin groups (largest first) into a few chunks per worker.
+    origin_groups = {}
+    for numbered_gap in numbered_gaps:
+        origin_groups.setdefault(numbered_gap[1][0], []).append(numbered_gap)
+    chunks = [[] for i in range(workers * 4)]
+    for (k, group) in enumerate(sorted(origin_groups.values(), key=len, reverse=True)):
+        chunks[k % len(chunks)].extend(group)
+    tasks = [(chunk, search, group_origins) for chunk in chunks if chunk]
+
+    _worker_graph = graph
+    try:
+        pool = multiprocessing.Pool(workers, _init_worker, (graph_loader,))
+        try:
+            solved = dict(pair for chunk_results in pool.map(_solve_chunk, tasks) for pair in chunk_results)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _worker_graph = None
+    return [(n, solved[n]) for (n, gap) in numbered_gaps]
+
+
+_worker_graph = None  # Graph used by worker processes
+
+
+def _init_worker(graph_loader):
+    global _worker_graph
+    if _worker_graph is None:
+        (loader, args) = graph_loader
+        _worker_graph = loader(*args)
+    return None
+
+
+def _solve_chunk(task):
+    (numbered_gaps, search, group_origins) = task
+    return solve_windowed_gaps(_worker_graph, numbered_gaps, search, group_origins)
+
+
+def path_in_window(graph, path, xmin, xmax, ymin, ymax):
+    ''' Check whether all of the nodes in a path are within a bounding box. '''
+    for node in path:
+        i = graph.node_index[node]
+        if not (xmin <= graph.x[i] <= xmax and ymin <= graph.y[i] <= ymax):
+            return False
+    return True
+
+
+def write_short_paths(results, short_path_txt, mode='w'):
+    ''' Write (cost, path) tuples to short_path_txt, one per line, in the
+        format read by SAS. '''
+    with open(short_path_txt, mode) as short_path:
+        for result in results:
+            short_path.write(str(result) + '\n')
+    return short_path_txt
+
+
+def write_path_errors(gaps, unreachable, path_errors_txt):
+    ''' Append a report of unreachable gaps (a list of (n, reason) pairs from
+        find_unreachable_gaps()) to path_errors_txt. '''
+    with open(path_errors_txt, 'a') as path_errors:
+        path_errors.write('***** SHORTEST PATH ERROR: NO PATH IN NETWORK, REVIEW CODING *****\n\n')
+        path_errors.write('{0:>8} {1:>8} {2:>8}  {3}\n'.format('gap', 'anode', 'bnode', 'reason'))
+        for (n, reason) in unreachable:
+            path_errors.write('{0:>8} {1:>8} {2:>8}  {3}\n'.format(n + 1, gaps[n][0], gaps[n][1], reason))
+        path_errors.write('\n')
+    return path_errors_txt
+
+
+def cpu_count():
+    ''' Number of CPUs available for worker processes. '''
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def parse_options(argv):
+    ''' Split command-line arguments into a list of positional arguments and
+        a dictionary of --name=value options. '''
+    args = []
+    options = {}
+    for arg in argv:
+        if arg.startswith('--') and '=' in arg:
+            (name, value) = arg[2:].split('=', 1)
+            options[name] = value
+        else:
+            args.append(arg)
+    return args, options
+
+
+def main(argv):
+    argv, options = parse_options(argv)
+    if argv[1] == '--batch':
+        gap_requests_csv, path_links_csv, short_path_txt = argv[2:5]
+        if 'graph' in options:
+            graph = load_graph(options['graph'], path_links_csv)
+            graph_loader = (read_graph_file, (options['graph'],))
+        else:
+            graph = read_path_links(path_links_csv)
+            graph_loader = (read_path_links, (path_links_csv,))
+        buffer = float(options.get('search', SEARCH)) * float(options.get('window', WINDOW))
+        gaps = read_gap_requests(gap_requests_csv, graph, buffer)
+        cache = None
+        if 'cache' in options:
+            cache = PathCache(options['cache'], file_fingerprint(path_links_csv))
+        unreachable = find_unreachable_gaps(graph, gaps)
+        if unreachable:
+            print('{0} gaps have no path in the network.'.format(len(unreachable)))
+            if 'errors' in options:
+                write_path_errors(gaps, unreachable, options['errors'])
+        workers = int(options.get('workers', 1)) or cpu_count()
+        print('Finding shortest paths for {0} gaps...'.format(len(gaps)))
+        results = solve_gap_requests(graph, gaps, cache=cache, workers=workers, graph_loader=graph_loader,
+                                     unreachable=unreachable)
+        write_short_paths(results, short_path_txt)
+        if cache is not None:
+            print('{0} of {1} gaps found in {2}.'.format(cache.hits, len(gaps), options['cache']))
+            cache.close()
+    else:
+        anode, bnode, link_dict_txt, short_path_txt = argv[1:5]
+        graph = read_link_dictionary(link_dict_txt)
+        print('Finding shortest path from {0} to {1}...'.format(anode, bnode))
+        result = find_shortest_path(graph, int(anode), int(bnode)) or NO_PATH
+        write_short_paths([result], short_path_txt, mode='a')
+    print('DONE')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
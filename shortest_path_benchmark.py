@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+'''
+    shortest_path_benchmark.py
+    Revised: 10/16/26
+    ---------------------------------------------------------------------------
+    This script times the shortest_path.py search engines on a synthetic
+    network of roughly MHN size, so that changes to the path engine can be
+    measured. It is not used by any of the MHN tools.
+
+      shortest_path_benchmark.py [--size=n] [--gaps=n] [--seed=n]
+                                 [--engines=name,name,...]
+
+    The network is a size x size grid of nodes a quarter mile apart (158 x
+    158 is about 25,000 nodes), with an arterial every mile, a few diagonal
+    expressways, one-way local streets and some missing local links. Arcs
+    are written to a network.csv (ANODE, BNODE, DIRECTIONS, MILES) and
+    nodes.csv, and read back with shortest_path.read_network_csv(), so
+    DIRECTIONS = 2 arcs become a link in each direction. A few small
+    "islands" are disconnected from the rest of the network.
+
+    Three gap workloads are generated (--gaps of each): short urban gaps (up
+    to 3 miles, near the center), long suburban gaps (10 to 25 miles), and
+    unreachable gaps (ending on an island). Each gap is given the window
+    that a batch run would use. The engines (all by default) are:
+
+      baseline  The original find_shortest_path() (see baseline_shortest_path())
+      heap      Dijkstra's algorithm with a binary heap
+      dijkstra  find_shortest_path()
+      astar     find_shortest_path_astar()
+      batch     solve_gap_requests(), i.e. a whole workload at a time
+
+    Each engine runs in its own process, which builds its own copy of the
+    network, so that the reported peak memory (resident set size) is its
+    own. Path costs of the windowed engines are checked against the first
+    one's. The time to load the network from a path links CSV & from a
+    binary graph file is also reported.
+
+'''
+from __future__ import print_function
+import heapq
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+import shortest_path
+
+ENGINES = ['baseline', 'heap', 'dijkstra', 'astar', 'batch']
+WORKLOADS = ['urban', 'suburban', 'unreachable']
+SPACING = 1320.0    # Feet between grid nodes
+ARTERIAL_EVERY = 4  # Grid rows/columns between arterials
+ISLAND_COUNT = 4    # Disconnected 5 x 5 grids
+FIRST_NODE = 5001
+
+
+# -----------------------------------------------------------------------------
+#  Generate network & workloads.
+# -----------------------------------------------------------------------------
+def generate_network(size, seed, out_dir):
+    ''' Write a synthetic network.csv, nodes.csv & path_links.csv to out_dir.
+        Main grid nodes are numbered row by row from FIRST_NODE, followed by
+        the island nodes (see network_index()). '''
+    rng = random.Random(seed)
+    grid = {}
+    coords = {}
+    node = FIRST_NODE
+    for row in range(size):
+        for col in range(size):
+            grid[(row, col)] = node
+            coords[node] = (
+                1000000 + col * SPACING + rng.uniform(-150, 150),
+                1800000 + row * SPACING + rng.uniform(-150, 150)
+            )
+            node += 1
+
+    arcs = []
+
+    def add_arc(anode, bnode, directions, curvature=1.0):
+        (ax, ay), (bx, by) = coords[anode], coords[bnode]
+        miles = math.hypot(bx - ax, by - ay) / 5280 * curvature
+        arcs.append((anode, bnode, directions, miles))
+
+    for (row, col), anode in grid.items():
+        for (d_row, d_col) in ((0, 1), (1, 0)):
+            bnode = grid.get((row + d_row, col + d_col))
+            if bnode is None:
+                continue
+            arterial = (row % ARTERIAL_EVERY == 0) if d_row == 0 else (col % ARTERIAL_EVERY == 0)
+            if arterial:
+                add_arc(anode, bnode, 2)
+            elif rng.random() < 0.05:
+                continue  # Missing local link (cul-de-sac, rail line, etc.)
+            elif rng.random() < 0.15:
+                if rng.random() < 0.5:
+                    anode, bnode = bnode, anode
+                add_arc(anode, bnode, 1, rng.uniform(1.0, 1.15))
+            else:
+                add_arc(anode, bnode, 2, rng.uniform(1.0, 1.15))
+
+    # Diagonal expressways, with a link every 2 miles.
+    step = 2 * ARTERIAL_EVERY
+    for start_col in range(0, size, size // 3 or 1):
+        k = 0
+        while grid.get((k + step, start_col + k + step)):
+            add_arc(grid[(k, start_col + k)], grid[(k + step, start_col + k + step)], 2)
+            k += step
+
+    islands = []
+    for island in range(ISLAND_COUNT):
+        x0 = 1000000 + rng.uniform(0, size * SPACING)
+        y0 = 1800000 + size * SPACING + 5280 * (2 + island)
+        island_grid = {}
+        for row in range(5):
+            for col in range(5):
+                island_grid[(row, col)] = node
+                coords[node] = (x0 + col * SPACING, y0 + row * SPACING)
+                islands.append(node)
+                node += 1
+        for (row, col), anode in island_grid.items():
+            for (d_row, d_col) in ((0, 1), (1, 0)):
+                if (row + d_row, col + d_col) in island_grid:
+                    add_arc(anode, island_grid[(row + d_row, col + d_col)], 2)
+
+    with open(os.path.join(out_dir, 'network.csv'), 'w') as writer:
+        writer.write('ANODE,BNODE,DIRECTIONS,MILES\n')
+        for arc in arcs:
+            writer.write('{0},{1},{2},{3:.4f}\n'.format(*arc))
+    with open(os.path.join(out_dir, 'nodes.csv'), 'w') as writer:
+        writer.write('NODE,POINT_X,POINT_Y\n')
+        for (node, (x, y)) in sorted(coords.items()):
+            writer.write('{0},{1:.3f},{2:.3f}\n'.format(node, x, y))
+    with open(os.path.join(out_dir, 'path_links.csv'), 'w') as writer:
+        for (anode, bnode, directions, miles) in arcs:
+            links = [(anode, bnode)] if directions == 1 else [(anode, bnode), (bnode, anode)]
+            for (a, b) in links:
+                writer.write('{0},{1},{2},{3:.3f},{4:.3f},{5:.3f},{6:.3f}\n'.format(
+                    a, b, int(round(miles, 4) * 100), coords[a][0], coords[a][1], coords[b][0], coords[b][1]))
+    return out_dir
+
+
+def generate_workloads(graph, grid, islands, size, gap_count, seed):
+    ''' Generate a {workload: [gap, ...]} dictionary of gap tuples (as read by
+        shortest_path.read_gap_requests()). '''
+    rng = random.Random(seed + 1)
+    workloads = dict((workload, []) for workload in WORKLOADS)
+    center = (size // 3, size - size // 3)
+    max_cells = int(25 * 5280 / SPACING)
+    while len(workloads['urban']) < gap_count:
+        row, col = rng.randrange(*center), rng.randrange(*center)
+        d_row, d_col = rng.randint(-12, 12), rng.randint(-12, 12)
+        if (row + d_row, col + d_col) in grid and (d_row or d_col):
+            workloads['urban'].append((grid[(row, col)], grid[(row + d_row, col + d_col)]))
+    attempts = 0
+    while len(workloads['suburban']) < gap_count and attempts < 100 * gap_count:
+        attempts += 1
+        row, col = rng.randrange(size), rng.randrange(size)
+        d_row, d_col = rng.randint(-max_cells, max_cells), rng.randint(-max_cells, max_cells)
+        if (row + d_row, col + d_col) in grid and 40 <= math.hypot(d_row, d_col) <= max_cells:
+            workloads['suburban'].append((grid[(row, col)], grid[(row + d_row, col + d_col)]))
+    while len(workloads['unreachable']) < gap_count:
+        anode = grid[(rng.randrange(size), rng.randrange(size))]
+        workloads['unreachable'].append((anode, rng.choice(islands)))
+    for workload in WORKLOADS:
+        workloads[workload] = [pair + graph.gap_window(*pair) for pair in workloads[workload]]
+    return workloads
+
+
+# -----------------------------------------------------------------------------
+#  Run engines.
+# -----------------------------------------------------------------------------
+def baseline_shortest_path(graph, start, end):
+    ''' Frozen copy of the original find_shortest_path() (the recipe by Chris
+        Laffra), which searched a dictionary of dictionaries, copying the path
+        into each queue entry. Changed only to run under Python 3 (items()
+        instead of iteritems()) and to return None rather than raise
+        IndexError when there is no path. '''
+    queue = [(0, start, [])]
+    seen = set()
+    while True:
+        if not queue:
+            return None
+        (p_cost, node, path) = heapq.heappop(queue)
+        if node not in seen:
+            path = path + [node]
+            seen.add(node)
+            if node == end:
+                return p_cost, path
+            if node in graph.keys():
+                for (b_node, b_cost) in graph[node].items():
+                    heapq.heappush(queue, (p_cost + b_cost, b_node, path))
+
+
+def baseline_window_dict(graph, in_window):
+    ''' The {anode: {bnode: cost}} dictionary of a gap's window, as each
+        original shortest_path.py run read from the link dictionary file that
+        SAS wrote for its gap. '''
+    node_ids, offsets, targets, weights = graph.node_ids, graph.offsets, graph.targets, graph.weights
+    window_dict = {}
+    for i in range(len(graph)):
+        if in_window[i] and offsets[i] < offsets[i + 1]:
+            window_dict[node_ids[i]] = dict(
+                (node_ids[targets[slot]], weights[slot]) for slot in range(offsets[i], offsets[i + 1]))
+    return window_dict
+
+
+def find_shortest_path_heap(graph, start, end, in_window=None):
+    ''' find_shortest_path(), always using a binary heap. '''
+    if start not in graph or end not in graph:
+        return None
+    t = graph.node_index[end]
+    pred = array('l', [-1]) * len(graph)
+    for (p_cost, i) in shortest_path.settle_nodes_heap(graph, graph.node_index[start], pred, in_window):
+        if i == t:
+            return p_cost, [graph.node_ids[j] for j in shortest_path.trace_path(pred, t)]
+    return None
+
+
+def peak_rss_mb():
+    ''' Peak resident set size of this process in MB, or None if unknown. '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+
+def run_engine(task):
+    ''' Run one engine on every workload, in a worker process. Returns a
+        {workload: (seconds, [cost, ...])} dictionary, plus setup seconds. '''
+    (engine, out_dir, size, gap_count, seed) = task
+    graph = shortest_path.read_network_csv(
+        os.path.join(out_dir, 'network.csv'), os.path.join(out_dir, 'nodes.csv'))
+    (grid, islands) = network_index(graph, size)
+    workloads = generate_workloads(graph, grid, islands, size, gap_count, seed)
+
+    setup_start = time.time()
+    graph.components
+    graph.astar_bound
+    graph.window(0, 0, 0, 0)
+    setup = time.time() - setup_start
+
+    results = {}
+    for workload in WORKLOADS:
+        gaps = workloads[workload]
+        start = time.time()
+        if engine == 'batch':
+            paths = shortest_path.solve_gap_requests(graph, gaps)
+        elif engine == 'baseline':
+            # Building each gap's dictionary is timed, but not the process
+            # start & file parsing that each gap also cost originally.
+            paths = [baseline_shortest_path(baseline_window_dict(graph, graph.window(*gap[2:6])), gap[0], gap[1])
+                     for gap in gaps]
+        else:
+            search = {
+                'heap': find_shortest_path_heap,
+                'dijkstra': shortest_path.find_shortest_path,
+                'astar': shortest_path.find_shortest_path_astar,
+            }[engine]
+            paths = [search(graph, gap[0], gap[1], graph.window(*gap[2:6])) for gap in gaps]
+        seconds = time.time() - start
+        results[workload] = (seconds, [(path or shortest_path.NO_PATH)[0] for path in paths])
+    return engine, setup, results, peak_rss_mb()
+
+
+def network_index(graph, size):
+    ''' Return a {(row, col): node} dictionary of the main grid's nodes in
+        a generate_network() graph, and a list of its island nodes. '''
+    grid = dict(((k // size, k % size), FIRST_NODE + k) for k in range(size * size))
+    islands = [node for node in graph.node_ids if node >= FIRST_NODE + size * size]
+    return grid, islands
+
+
+def time_loading(out_dir):
+    ''' Time reading the network from path_links.csv & from a graph file. '''
+    path_links_csv = os.path.join(out_dir, 'path_links.csv')
+    graph_file = os.path.join(out_dir, 'network.graph')
+    start = time.time()
+    graph = shortest_path.read_path_links(path_links_csv)
+    csv_seconds = time.time() - start
+    shortest_path.write_graph_file(graph, graph_file)
+    start = time.time()
+    shortest_path.read_graph_file(graph_file)
+    return csv_seconds, time.time() - start
+
+
+# -----------------------------------------------------------------------------
+#  Report results.
+# -----------------------------------------------------------------------------
+def main(argv):
+    (args, options) = shortest_path.parse_options(argv)
+    size = int(options.get('size', 158))
+    gap_count = int(options.get('gaps', 200))
+    seed = int(options.get('seed', 1))
+    engines = options.get('engines', ','.join(ENGINES)).split(',')
+    for engine in engines:
+        if engine not in ENGINES:
+            sys.exit('Unknown engine: {0} (choose from {1})'.format(engine, ', '.join(ENGINES)))
+
+    out_dir = tempfile.mkdtemp(prefix='sp_benchmark_')
+    try:
+        generate_network(size, seed, out_dir)
+        graph = shortest_path.read_network_csv(
+            os.path.join(out_dir, 'network.csv'), os.path.join(out_dir, 'nodes.csv'))
+        print('Network: {0} nodes, {1} directional links. Gaps: {2} per workload.'.format(
+            len(graph), graph.link_count, gap_count))
+        (csv_seconds, graph_file_seconds) = time_loading(out_dir)
+        print('Load: {0:.3f} s from path links CSV, {1:.3f} s from graph file.'.format(csv_seconds, graph_file_seconds))
+        del graph
+        print()
+        print('{0:<10} {1:<12} {2:>9} {3:>10} {4:>11} {5:>9} {6:>8}'.format(
+            'engine', 'workload', 'setup s', 'seconds', 'queries/s', 'peak MB', 'cost ok'))
+
+        reference = None
+        for engine in engines:
+            pool = multiprocessing.Pool(1)
+            try:
+                (engine, setup, results, peak) = pool.apply(run_engine, ((engine, out_dir, size, gap_count, seed),))
+            finally:
+                pool.close()
+                pool.join()
+            if reference is None:
+                reference = results
+            for workload in WORKLOADS:
+                (seconds, costs) = results[workload]
+                mismatches = sum(1 for (a, b) in zip(costs, reference[workload][1]) if a != b)
+                check = 'yes' if not mismatches else '{0} bad'.format(mismatches)
+                print('{0:<10} {1:<12} {2:>9.2f} {3:>10.3f} {4:>11.1f} {5:>9} {6:>8}'.format(
+                    engine, workload, setup, seconds, len(costs) / seconds if seconds else float('inf'),
+                    '{0:.0f}'.format(peak) if peak is not None else 'n/a', check))
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -201,39 +201,34 @@ with open(tipid_uncodable_csv, 'r') as no_code:
 #  Check for inappropriately coded projects.
 # -----------------------------------------------------------------------------
 common_id_field = MHN.route_systems[MHN.hwyproj][1]
-hwyproj_view = 'hwyproj_view'
-arcpy.MakeTableView_management(MHN.hwyproj, hwyproj_view)
 
-# Select projects in MHN but not in year.csv:
-unmatched_hwyproj_query = ''' "{0}" NOT IN ('{1}') '''.format(common_id_field, "','".join((str(k) for k in hwyproj_years.keys())))
-arcpy.SelectLayerByAttribute_management(hwyproj_view, selection_type='NEW_SELECTION', where_clause=unmatched_hwyproj_query)
-
-# Ignore out-of-region projects:
-out_of_region_query = ''' "{0}" LIKE '14______' '''.format(common_id_field)
-arcpy.SelectLayerByAttribute_management(hwyproj_view, selection_type='REMOVE_FROM_SELECTION', where_clause=out_of_region_query)
+# Select projects in MHN but not in year.csv (in a single pass over the table,
+# rather than with a NOT IN query listing every project in year.csv), ignoring
+# out-of-region projects:
+in_region_query = ''' NOT "{0}" LIKE '14______' '''.format(common_id_field)
+unmatched_hwyproj = MHN.iter_rows_by_keys(
+    MHN.hwyproj, common_id_field, (str(k) for k in hwyproj_years.keys()),
+    [common_id_field, 'COMPLETION_YEAR'], in_region_query, exclude=True
+)
 
 # Ignore projects not being conformed:
-not_conformed_query = '"COMPLETION_YEAR" > {0}'.format(MHN.max_year)
-arcpy.SelectLayerByAttribute_management(hwyproj_view, selection_type='REMOVE_FROM_SELECTION', where_clause=not_conformed_query)
+miscoded_hwyproj = [row for row in unmatched_hwyproj if not row[1] > MHN.max_year]
 
 # Report any MHN projects not in year lists:
-if int(arcpy.GetCount_management(hwyproj_view).getOutput(0)) == 0:
+if not miscoded_hwyproj:
     arcpy.AddMessage((
         '''{0}All in-region, conformed projects coded in MHN are listed in '''
         '''{1} or {2}!'''
         ).format('\n', tipid_conformed_csv, tipid_exempt_csv))
 else:
     with open(in_mhn_not_year_txt, 'w') as miscoded_output:
-        with arcpy.da.SearchCursor(hwyproj_view, [common_id_field, 'COMPLETION_YEAR']) as cursor:
-            for row in cursor:
-                miscoded_output.write('{0},{1}\n'.format(row[0], row[1]))
+        for row in miscoded_hwyproj:
+            miscoded_output.write('{0},{1}\n'.format(row[0], row[1]))
     arcpy.AddWarning((
         '''{0}WARNING: Some in-region, conformed projects coded in MHN are '''
         '''not listed in {1} or {2}. See {3} for details.'''
         ).format('\n', tipid_conformed_csv, tipid_exempt_csv, in_mhn_not_year_txt))
 
-arcpy.Delete_management(hwyproj_view)
-
 
 # -----------------------------------------------------------------------------
 #  Check for still-uncoded projects.